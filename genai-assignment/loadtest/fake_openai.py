@@ -0,0 +1,168 @@
+"""
+Local stand-in for the Azure OpenAI endpoints used by phase2/llm_client.py
+(chat completions, streamed or not, and embeddings), for load tests that
+should not spend real quota.
+
+Run it and point the API at it:
+
+    uvicorn loadtest.fake_openai:app --port 9000
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9000 AZURE_OPENAI_KEY=fake uvicorn phase2.api:app --port 8000
+
+Configuration (environment variables):
+    FAKE_CHAT_LATENCY       "median,sigma" of the lognormal time to the first token, seconds (default 0.8,0.4)
+    FAKE_EMBEDDING_LATENCY  "median,sigma" of the embedding latency, seconds (default 0.05,0.3)
+    FAKE_TOKEN_SECONDS      time per streamed reply token (default 0.02)
+    FAKE_REPLY_TOKENS       reply length in words (default 80)
+    FAKE_429_RATE           fraction of requests answered with 429 (default 0)
+    FAKE_RETRY_AFTER        Retry-After sent with a 429, seconds (default 1)
+    FAKE_EMBEDDING_DIM      embedding size (default 1536, like ada-002)
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from phase2.tokens import count_tokens
+
+
+def latency_setting(name: str, default: str):
+    median, sigma = (float(x) for x in os.getenv(name, default).split(","))
+    return median, sigma
+
+
+CHAT_LATENCY = latency_setting("FAKE_CHAT_LATENCY", "0.8,0.4")
+EMBEDDING_LATENCY = latency_setting("FAKE_EMBEDDING_LATENCY", "0.05,0.3")
+TOKEN_SECONDS = float(os.getenv("FAKE_TOKEN_SECONDS", "0.02"))
+REPLY_TOKENS = int(os.getenv("FAKE_REPLY_TOKENS", "80"))
+RATE_LIMIT_FRACTION = float(os.getenv("FAKE_429_RATE", "0"))
+RETRY_AFTER = os.getenv("FAKE_RETRY_AFTER", "1")
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+
+REPLY_WORDS = {
+    "he": "בהתאם למידע במאגר הידע השירות ניתן לחברי הקופה בהנחה לפי רמת הביטוח".split(),
+    "en": "according to the knowledge base this service is available to members at a discount by tier".split(),
+}
+
+# Opening lines of the extraction prompts (phase2/extraction.py, phase2/prompts.py).
+# Other prompts mention JSON too ("no JSON, no Markdown"), so the word alone is not enough.
+EXTRACTION_MARKERS = ("information extraction engine", "מנוע לחילוץ מידע", "מנוע חילוץ מידע")
+
+app = FastAPI(title="Fake Azure OpenAI")
+
+
+def sample_latency(setting) -> float:
+    median, sigma = setting
+    return random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+def rate_limited():
+    if random.random() < RATE_LIMIT_FRACTION:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+            headers={"Retry-After": RETRY_AFTER}
+        )
+    return None
+
+
+def fake_embedding(text: str) -> list:
+    """
+    Deterministic unit vector for a text (the same text always gets the same vector).
+    """
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_reply(messages: list) -> str:
+    system = messages[0]["content"] if messages else ""
+    if any(marker in system for marker in EXTRACTION_MARKERS):
+        # The extraction prompt: nothing recognized
+        return "{}"
+
+    last = messages[-1]["content"] if messages else ""
+    language = "he" if any("א" <= c <= "ת" for c in last) else "en"
+    words = REPLY_WORDS[language]
+    return " ".join(words[i % len(words)] for i in range(REPLY_TOKENS))
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    limited = rate_limited()
+    if limited is not None:
+        return limited
+
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(sample_latency(EMBEDDING_LATENCY))
+
+    tokens = sum(count_tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "model": deployment,
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    limited = rate_limited()
+    if limited is not None:
+        return limited
+
+    body = await request.json()
+    messages = body.get("messages", [])
+    reply = fake_reply(messages)
+    prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+    completion_tokens = count_tokens(reply)
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(sample_latency(CHAT_LATENCY) + TOKEN_SECONDS * len(reply.split()))
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": created,
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    async def stream():
+        def chunk(choices):
+            data = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                    "created": created, "model": deployment, "choices": choices}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        # Like Azure, the first chunk carries no choices (content filter results)
+        yield chunk([])
+        await asyncio.sleep(sample_latency(CHAT_LATENCY))
+
+        for i, word in enumerate(reply.split()):
+            piece = word if i == 0 else " " + word
+            yield chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            await asyncio.sleep(TOKEN_SECONDS)
+
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
@@ -0,0 +1,284 @@
+"""
+Replays multi-turn Hebrew/English conversations against the chat API at a
+target concurrency and reports latency percentiles and throughput per phase.
+
+Each simulated user gives their details over a few turns (collecting_info),
+then asks questions about the services in phase2_data (qa). If the server has
+not completed the profile after the collection turns (e.g. the fake server
+extracts nothing), the generator fills it in from the persona so the QA turns
+still run in the qa phase.
+
+Usage (with loadtest.fake_openai serving the Azure endpoints, see its docstring):
+    python -m loadtest.load_generator --url http://127.0.0.1:8000 --concurrency 20 --conversations 200
+    python -m loadtest.load_generator --concurrency 50 --duration 120 --stream --session
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+
+PERSONAS = {
+    "he": [
+        {"first_name": "דנה", "last_name": "כהן", "gender": "נקבה", "hmo": "מכבי", "insurance_tier": "זהב"},
+        {"first_name": "יוסי", "last_name": "לוי", "gender": "זכר", "hmo": "כללית", "insurance_tier": "כסף"},
+        {"first_name": "מיכל", "last_name": "אברהם", "gender": "נקבה", "hmo": "מאוחדת", "insurance_tier": "ארד"},
+    ],
+    "en": [
+        {"first_name": "Dana", "last_name": "Cohen", "gender": "Female", "hmo": "Maccabi", "insurance_tier": "Gold"},
+        {"first_name": "Yossi", "last_name": "Levi", "gender": "Male", "hmo": "Clalit", "insurance_tier": "Silver"},
+        {"first_name": "Michal", "last_name": "Avraham", "gender": "Female", "hmo": "Meuhedet", "insurance_tier": "Bronze"},
+    ],
+}
+
+COLLECTION_TURNS = {
+    "he": [
+        "שלום, קוראים לי {first_name} {last_name}",
+        "מספר תעודת הזהות שלי {id_number}, אני {gender} בן {age}",
+        "אני בקופת {hmo}, מספר כרטיס {hmo_card_number}, רמת ביטוח {insurance_tier}",
+        "כן, הפרטים נכונים",
+    ],
+    "en": [
+        "Hi, my name is {first_name} {last_name}",
+        "My ID number is {id_number}, I'm {gender}, {age} years old",
+        "I'm with {hmo}, card number {hmo_card_number}, {insurance_tier} tier",
+        "Yes, that's all correct",
+    ],
+}
+
+# Questions on the topics of phase2_data (alternative medicine, communication
+# clinics, dental, optometry, pregnancy, workshops)
+QUESTIONS = {
+    "he": [
+        "כמה הנחה יש לי על דיקור סיני?",
+        "האם יש כיסוי לטיפולי קלינאות תקשורת לילדים?",
+        "כמה עולה ניקוי אבנית?",
+        "האם יש הנחה על משקפיים או עדשות מגע?",
+        "אילו בדיקות הריון כלולות בביטוח שלי?",
+        "אילו סדנאות להפסקת עישון יש?",
+        "מה מספר הטלפון לקביעת תור לרפואת שיניים?",
+    ],
+    "en": [
+        "What discount do I get on acupuncture?",
+        "Are speech therapy sessions for children covered?",
+        "How much does dental cleaning cost?",
+        "Is there a discount on glasses or contact lenses?",
+        "Which pregnancy tests are included in my plan?",
+        "What smoking cessation workshops are available?",
+        "What is the phone number for booking a dental appointment?",
+    ],
+}
+
+
+def make_persona(language: str, rng: random.Random) -> dict:
+    persona = dict(rng.choice(PERSONAS[language]))
+    persona["id_number"] = "".join(rng.choice("0123456789") for _ in range(9))
+    persona["hmo_card_number"] = "".join(rng.choice("0123456789") for _ in range(9))
+    persona["age"] = rng.randint(18, 90)
+    return persona
+
+
+def sse_reply(response, started: float) -> tuple:
+    """
+    Reads a /chat/stream response. Returns (final payload, seconds to the first token).
+    """
+    event, final, first_token = None, None, None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):])
+            if event == "token":
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            elif event == "error":
+                raise RuntimeError(data.get("reply", "stream error"))
+            else:
+                final = data
+    if final is None:
+        raise RuntimeError("stream ended without a final event")
+    return final, first_token
+
+
+class Stats:
+    """
+    Latencies, time to first token and errors per phase, shared by the workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.first_tokens = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, phase: str, seconds: float, first_token=None) -> None:
+        with self.lock:
+            self.latencies[phase].append(seconds)
+            if first_token is not None:
+                self.first_tokens[phase].append(first_token)
+
+    def error(self, phase: str) -> None:
+        with self.lock:
+            self.errors[phase] += 1
+
+
+class Conversation:
+    """
+    One simulated user talking to the API, the way phase2_app.py does
+    (full profile and history per request, or a server-side session).
+    """
+
+    def __init__(self, http: requests.Session, args, stats: Stats, rng: random.Random):
+        self.http = http
+        self.args = args
+        self.stats = stats
+        self.language = rng.choice(args.languages)
+        self.persona = make_persona(self.language, rng)
+        self.questions = rng.sample(QUESTIONS[self.language], min(args.questions, len(QUESTIONS[self.language])))
+        self.profile = {}
+        self.history = []
+        self.phase = "collecting_info"
+        self.session_id = None
+
+    def open_session(self) -> None:
+        response = self.http.post(f"{self.args.url}/session", json={
+            "user_profile": self.profile,
+            "conversation_history": self.history
+        }, timeout=self.args.timeout)
+        response.raise_for_status()
+        self.session_id = response.json()["session_id"]
+
+    def send(self, message: str) -> None:
+        phase = self.phase
+        self.history.append({"role": "user", "content": message, "phase": phase})
+        if self.session_id:
+            payload = {"message": message, "language": self.language, "session_id": self.session_id}
+        else:
+            payload = {"message": message, "language": self.language,
+                       "user_profile": self.profile, "conversation_history": self.history}
+
+        started = time.perf_counter()
+        first_token = None
+        try:
+            if self.args.stream:
+                with self.http.post(f"{self.args.url}/chat/stream", json=payload,
+                                    stream=True, timeout=self.args.timeout) as response:
+                    response.raise_for_status()
+                    data, first_token = sse_reply(response, started)
+            else:
+                response = self.http.post(f"{self.args.url}/chat", json=payload, timeout=self.args.timeout)
+                response.raise_for_status()
+                data = response.json()
+        except Exception:
+            self.stats.error(phase)
+            self.history.pop()
+            return
+
+        self.stats.add(phase, time.perf_counter() - started, first_token)
+        self.history.append({"role": "assistant", "content": data["reply"], "phase": phase})
+        self.profile = data["updated_user_profile"]
+        self.phase = data["next_phase"]
+
+    def run(self) -> None:
+        if self.args.session:
+            self.open_session()
+
+        for template in COLLECTION_TURNS[self.language]:
+            if self.phase == "qa":
+                break
+            self.send(template.format(**self.persona))
+
+        if self.phase != "qa":
+            # The server did not fill the profile (nothing was extracted): continue as if it had
+            self.profile = dict(self.persona)
+            self.phase = "qa"
+            if self.args.session:
+                self.open_session()
+
+        for question in self.questions:
+            self.send(question)
+
+
+def worker(args, stats: Stats, deadline: float, remaining: list, seed: int) -> None:
+    rng = random.Random(seed)
+    http = requests.Session()
+    while time.monotonic() < deadline:
+        with stats.lock:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        try:
+            Conversation(http, args, stats, rng).run()
+        except Exception:
+            # Could not open a session
+            stats.error("session")
+
+
+def percentile_row(name: str, values: list, errors: int, elapsed: float) -> str:
+    if not values:
+        return f"{name:<18}{0:>8}{errors:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{0.0:>8.2f}"
+    ms = np.array(values) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return (f"{name:<18}{len(values):>8}{errors:>8}{ms.mean():>10.0f}"
+            f"{p50:>10.0f}{p95:>10.0f}{p99:>10.0f}{len(values) / elapsed:>8.2f}")
+
+
+def report(stats: Stats, elapsed: float, args) -> None:
+    mode = ("stream" if args.stream else "chat") + (", session" if args.session else "")
+    print(f"\n== {args.url} ({mode}): concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"{'phase':<18}{'requests':>8}{'errors':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>8}")
+
+    phases = sorted(set(stats.latencies) | set(stats.errors))
+    for phase in phases:
+        print(percentile_row(phase, stats.latencies[phase], stats.errors[phase], elapsed))
+
+    everything = [seconds for values in stats.latencies.values() for seconds in values]
+    print(percentile_row("total", everything, sum(stats.errors.values()), elapsed))
+
+    if args.stream:
+        print("\ntime to first token")
+        for phase in sorted(stats.first_tokens):
+            print(percentile_row(phase, stats.first_tokens[phase], 0, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the chat API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of phase2.api")
+    parser.add_argument("--concurrency", type=int, default=10, help="Simultaneous conversations")
+    parser.add_argument("--conversations", type=int, default=100, help="Conversations to run in total")
+    parser.add_argument("--duration", type=float, default=None, help="Stop starting conversations after this many seconds")
+    parser.add_argument("--questions", type=int, default=3, help="QA questions per conversation")
+    parser.add_argument("--languages", nargs="+", default=["he", "en"], choices=["he", "en"])
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream and report time to first token")
+    parser.add_argument("--session", action="store_true", help="Use server-side sessions")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = Stats()
+    remaining = [args.conversations if args.duration is None else float("inf")]
+    started = time.monotonic()
+    deadline = started + (args.duration if args.duration is not None else float("inf"))
+
+    threads = [
+        threading.Thread(target=worker, args=(args, stats, deadline, remaining, args.seed + i), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("Interrupted, reporting what was measured so far.")
+
+    report(stats, time.monotonic() - started, args)
+
+
+if __name__ == "__main__":
+    main()
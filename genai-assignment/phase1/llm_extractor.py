@@ -14,10 +14,19 @@ AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 if not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_KEY:
     raise RuntimeError("Missing Azure OpenAI credentials")
 
+# Per-attempt timeout and retries of the extraction call. A form is never waited
+# on for more than about (retries + 1) * timeout seconds plus the backoff.
+LLM_TIMEOUT = float(os.getenv("PHASE1_LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("PHASE1_LLM_MAX_RETRIES", "3"))
+
 client = AzureOpenAI(
     api_key=AZURE_OPENAI_KEY,
     azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version="2024-02-15-preview"
+    api_version="2024-02-15-preview",
+    # Phase 1 runs in its own Streamlit process, outside phase 2's scheduler.
+    # The SDK backs off between retries and honours Retry-After on 429s.
+    max_retries=LLM_MAX_RETRIES,
+    timeout=LLM_TIMEOUT
 )
 
 def clean_json_string(text: str) -> str:
@@ -0,0 +1,170 @@
+import os
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+
+# Retrieval backend: "exact" (brute-force scan) or "ivf" (approximate, inverted file)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "exact")
+
+# IVF tuning. More lists = smaller lists to scan; more probes = higher recall, slower search.
+# IVF_NLIST=0 picks a size from the corpus (about 4 * sqrt(N)).
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_TRAIN_ITERATIONS = int(os.getenv("IVF_TRAIN_ITERATIONS", "10"))
+
+
+def ivf_file(name: str) -> str:
+    return f"ivf-{name}.npz"
+
+
+def top_k_ids(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Positions of the top_k highest scores, best first (partial sort).
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    ids = np.argpartition(-scores, top_k - 1)[:top_k]
+    return ids[np.argsort(-scores[ids])]
+
+
+class ExactIndex:
+    """
+    Brute-force search: scores every row with one matrix-vector product.
+    """
+
+    name = "exact"
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.matrix @ query
+        ids = top_k_ids(scores, top_k)
+        return ids, scores[ids]
+
+    def save(self, directory: Path, name: str = "all-all") -> None:
+        # Nothing to persist besides the matrix itself
+        pass
+
+
+class IVFIndex:
+    """
+    Inverted-file index over normalized vectors.
+
+    Rows are clustered with spherical k-means. A query is compared with the
+    centroids first, and only the rows of the 'nprobe' closest lists are scored.
+    Lists are stored CSR-style: list i holds list_ids[offsets[i]:offsets[i + 1]].
+    """
+
+    name = "ivf"
+
+    def __init__(self, matrix: np.ndarray, centroids: np.ndarray,
+                 list_ids: np.ndarray, offsets: np.ndarray, nprobe: int = IVF_NPROBE):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE,
+              iterations: int = IVF_TRAIN_ITERATIONS, seed: int = 0) -> "IVFIndex":
+        n = len(matrix)
+        if nlist <= 0:
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample, large corpora do not need every row to place centroids
+        sample = matrix
+        if n > nlist * 256:
+            sample = matrix[rng.choice(n, nlist * 256, replace=False)]
+
+        centroids = np.array(sample[rng.choice(len(sample), nlist, replace=False)], dtype=np.float32)
+
+        for _ in range(iterations):
+            assignments = cls._assign(sample, centroids)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Re-seed empty lists with random rows
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        assignments = cls._assign(matrix, centroids)
+        list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+
+        return cls(matrix, centroids, list_ids, offsets, nprobe=nprobe)
+
+    @staticmethod
+    def _assign(rows: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+        """
+        Nearest centroid of every row, computed in blocks to bound memory.
+        """
+        assignments = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), block):
+            assignments[start:start + block] = np.argmax(rows[start:start + block] @ centroids.T, axis=1)
+        return assignments
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = top_k_ids(self.centroids @ query, nprobe)
+
+        candidates = np.concatenate(
+            [self.list_ids[self.offsets[i]:self.offsets[i + 1]] for i in lists]
+        )
+        if len(candidates) == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+
+        scores = self.matrix[candidates] @ query
+        best = top_k_ids(scores, top_k)
+        return candidates[best], scores[best]
+
+    def save(self, directory: Path, name: str = "all-all") -> None:
+        # Per-process temporary name: workers that train the same lists never share a file
+        tmp_path = Path(directory) / f".{ivf_file(name)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, list_ids=self.list_ids, offsets=self.offsets)
+        os.replace(tmp_path, Path(directory) / ivf_file(name))
+
+    @classmethod
+    def load(cls, directory: Path, matrix: np.ndarray, name: str = "all-all",
+             nprobe: int = IVF_NPROBE) -> "IVFIndex":
+        with np.load(Path(directory) / ivf_file(name)) as data:
+            return cls(matrix, data["centroids"], data["list_ids"], data["offsets"], nprobe=nprobe)
+
+
+def create_backend(matrix: np.ndarray, name: str = "all-all", backend: str = RETRIEVAL_BACKEND,
+                   directory: Path = None):
+    """
+    Returns the search backend selected by configuration for one partition of the store.
+    For IVF, a saved index named after the partition in 'directory' is reused,
+    otherwise it is trained (and saved there).
+    """
+    if backend == "exact" or len(matrix) == 0:
+        return ExactIndex(matrix)
+
+    if backend != "ivf":
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+
+    if directory is not None and (Path(directory) / ivf_file(name)).exists():
+        return IVFIndex.load(directory, matrix, name)
+
+    index = IVFIndex.build(matrix)
+    if directory is not None:
+        index.save(directory, name)
+    return index
@@ -0,0 +1,142 @@
+"""
+Recall@k vs. latency report for the retrieval backends in phase2.ann.
+
+Compares approximate IVF search (at several nprobe values) with exact search on:
+- the phase2 knowledge index (if it has been built, see phase2.index_store)
+- a synthetic clustered corpus of any size, spread over HMO / tier partitions
+
+Like the API, every partition gets its own backend and a query only searches
+the partitions of its user (their HMO and tier plus the general ones).
+Queries are corpus vectors with added noise, each asked by a user of the
+partition the vector came from, so no embedding calls are needed.
+
+Usage:
+    python -m phase2.ann_benchmark --synthetic-size 50000 --dim 384 --k 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phase2.ann import ExactIndex, IVFIndex
+from phase2.metadata import HMO_ALIASES, TIER_ALIASES
+from phase2.vector_store import VectorStore, normalize_rows, partition_key
+
+
+def make_queries(store: VectorStore, count: int, noise: float, rng):
+    """
+    Noisy copies of random rows, and the partitions searched for each: those of a
+    user with the row's HMO and tier (a random one where the row is general).
+    """
+    rows = rng.choice(len(store), count)
+    matrix = np.asarray(store.matrix)[rows]
+    queries = normalize_rows(matrix + rng.normal(scale=noise, size=matrix.shape).astype(np.float32))
+
+    keys = []
+    for row in rows:
+        hmo, tier = partition_key(store.chunks[row])
+        keys.append(store.partition_keys(hmo or rng.choice(list(HMO_ALIASES)),
+                                         tier or rng.choice(list(TIER_ALIASES))))
+    return queries.astype(np.float32), keys
+
+
+def synthetic_store(size: int, dim: int, clusters: int, rng) -> VectorStore:
+    """
+    Clustered vectors spread evenly over the HMO x tier partitions and the general ones.
+    """
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    points = centers[labels] + rng.normal(scale=0.6, size=(size, dim)).astype(np.float32)
+
+    hmos, tiers = [None, *HMO_ALIASES], [None, *TIER_ALIASES]
+    chunks = [
+        {"text": "", "hmo": hmos[rng.integers(len(hmos))], "tier": tiers[rng.integers(len(tiers))]}
+        for _ in range(size)
+    ]
+    # Sorted by partition, like a built index, so partitions are views of the matrix
+    order = sorted(range(size), key=lambda i: partition_key(chunks[i]))
+    matrix = normalize_rows(points[order]).astype(np.float32)
+    return VectorStore.from_normalized([chunks[i] for i in order], matrix)
+
+
+def measure(store: VectorStore, queries: np.ndarray, keys: list, k: int):
+    results, latencies = [], []
+    for query, query_keys in zip(queries, keys):
+        start = time.perf_counter()
+        ids, _ = store.search_ids(query, k, query_keys)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(ids.tolist()))
+    return results, np.array(latencies)
+
+
+def report(name: str, store: VectorStore, queries: np.ndarray, keys: list, k: int,
+           nlist: int, nprobes: list) -> None:
+    sizes = [len(partition.ids) for partition in store.partitions.values()]
+    searched = np.mean([sum(len(store.partitions[key].ids) for key in query_keys) for query_keys in keys])
+    print(f"\n== {name}: {len(store)} vectors x {store.matrix.shape[1]} dims in {len(sizes)} partitions "
+          f"({min(sizes)}-{max(sizes)} rows), {len(queries)} queries searching {searched:.0f} rows on average, k={k}")
+
+    store.use_backend(lambda matrix, _: ExactIndex(matrix))
+    exact_results, exact_latency = measure(store, queries, keys, k)
+    print(f"{'backend':<22}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':<22}{1.0:>10.3f}{exact_latency.mean():>10.3f}{np.percentile(exact_latency, 95):>10.3f}")
+
+    start = time.perf_counter()
+    store.use_backend(lambda matrix, _: IVFIndex.build(matrix, nlist=nlist))
+    lists = [len(partition.index.centroids) for partition in store.partitions.values()]
+    print(f"(IVF trained per partition with {min(lists)}-{max(lists)} lists in {time.perf_counter() - start:.1f}s)")
+
+    for nprobe in nprobes:
+        if nprobe > max(lists):
+            break
+        for partition in store.partitions.values():
+            partition.index.nprobe = nprobe
+        results, latency = measure(store, queries, keys, k)
+        recall = np.mean([
+            len(found & expected) / max(1, min(k, len(expected)))
+            for found, expected in zip(results, exact_results)
+        ])
+        print(f"{f'ivf nprobe={nprobe}':<22}{recall:>10.3f}{latency.mean():>10.3f}{np.percentile(latency, 95):>10.3f}")
+
+
+def load_phase2_store():
+    """
+    Returns the built knowledge index, or None if unavailable.
+    """
+    try:
+        from phase2.index_store import load_index
+        store = load_index()
+    except Exception as e:
+        print(f"Skipping phase2 corpus: {e}")
+        return None
+
+    if store is None or len(store) == 0:
+        print("Skipping phase2 corpus: no index built yet (python -m phase2.index_store).")
+        return None
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs. latency of exact and IVF retrieval.")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--synthetic-size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    phase2_store = load_phase2_store()
+    if phase2_store is not None:
+        report("phase2 corpus", phase2_store,
+               *make_queries(phase2_store, args.queries, args.noise, rng),
+               args.k, args.nlist, args.nprobe)
+
+    synthetic = synthetic_store(args.synthetic_size, args.dim, args.clusters, rng)
+    report("synthetic corpus", synthetic,
+           *make_queries(synthetic, args.queries, args.noise, rng),
+           args.k, args.nlist, args.nprobe)
@@ -0,0 +1,165 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from phase2.lexical import words
+from phase2.metadata import canonical_hmo, canonical_tier
+from phase2.vector_store import normalize_vector
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+
+
+def profile_key(hmo: Optional[str], tier: Optional[str], language: str) -> Tuple[str, str, str]:
+    """
+    Answers are only shared between users with the same HMO, tier and language.
+    """
+    return (canonical_hmo(hmo) or hmo or "", canonical_tier(tier) or tier or "", language)
+
+
+def history_key(messages: List[Dict]) -> str:
+    """
+    Hash of the QA turns preceding a question. A reply depends on them
+    ("and for silver?"), so it is only reused after the same QA history.
+    """
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message['role']}:{question_text(message['content'])}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def question_text(text: str) -> str:
+    """
+    Normalized question for exact matches (case, punctuation, niqqud and spacing ignored).
+    """
+    return " ".join(words(text))
+
+
+class AnswerCache:
+    """
+    Semantic cache of QA answers.
+
+    Entries are grouped by key: the profile key (hmo, tier, language) and the
+    history key of the QA turns before the question. A lookup returns
+    the stored reply of a cached question of the same group with the same
+    normalized text, or else whose embedding has a cosine similarity of at
+    least 'threshold' with the query embedding. Questions answered through the
+    lexical fast path have no embedding and only match by text.
+    Entries expire after 'ttl_seconds', the least recently used ones are
+    evicted beyond 'max_entries', and everything is dropped when the knowledge
+    index version changes.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._groups: Dict[tuple, set] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._index_version = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, index_version: str) -> None:
+        # Caller holds the lock
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._groups.clear()
+            self._index_version = index_version
+
+    def _remove(self, entry_id: int) -> None:
+        # Caller holds the lock
+        entry = self._entries.pop(entry_id)
+        group = self._groups[entry["key"]]
+        group.discard(entry_id)
+        if not group:
+            del self._groups[entry["key"]]
+
+    def lookup(self, key: tuple, query_vector, index_version: str, text: Optional[str] = None) -> Optional[str]:
+        query = normalize_vector(query_vector) if query_vector is not None else None
+        text = question_text(text) if text is not None else None
+
+        with self._lock:
+            self._check_version(index_version)
+
+            now = time.time()
+            expired = [i for i in self._groups.get(key, ()) if now - self._entries[i]["created"] > self.ttl_seconds]
+            for entry_id in expired:
+                self._remove(entry_id)
+
+            ids = list(self._groups.get(key, ()))
+            if text:
+                match = next((i for i in ids if self._entries[i]["text"] == text), None)
+                if match is not None:
+                    return self._hit(match)
+
+            ids = [i for i in ids if self._entries[i]["vector"] is not None]
+            if query is None or not ids:
+                self.misses += 1
+                return None
+
+            vectors = np.stack([self._entries[i]["vector"] for i in ids])
+            scores = vectors @ query
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            return self._hit(ids[best])
+
+    def _hit(self, entry_id: int) -> str:
+        # Caller holds the lock
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return self._entries[entry_id]["reply"]
+
+    def store(self, key: tuple, query_vector, index_version: str, reply: str,
+              text: Optional[str] = None) -> None:
+        query = normalize_vector(query_vector) if query_vector is not None else None
+        text = question_text(text) if text is not None else None
+        if query is None and not text:
+            return
+
+        with self._lock:
+            self._check_version(index_version)
+
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "key": key,
+                "vector": query,
+                "text": text,
+                "reply": reply,
+                "created": time.time()
+            }
+            self._groups.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+)
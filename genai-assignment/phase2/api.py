@@ -1,34 +1,79 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
-import math
+import asyncio
+import json
+import os
 import time
+import uuid
 
-from phase2.schemas import ChatRequest, ChatResponse
+from phase2.schemas import ChatMessage, ChatRequest, ChatResponse, SessionRequest
 from phase2.prompts import (
     user_information_collection_prompt,
     qa_prompt
 )
-from phase2.knowledge_loader import load_knowledge
-from phase2.llm_client import call_llm, get_embedding
-from phase2.extraction import extract_user_info
-from phase2.logger import logger  # Import the logger
+from phase2.knowledge_base import KnowledgeBase
+from phase2.llm_client import acall_llm, astream_llm
+from phase2.embedding_cache import get_query_embedding, aget_query_embedding, query_cache
+from phase2.answer_cache import answer_cache, profile_key, history_key, ANSWER_CACHE_ENABLED
+from phase2.retriever import Retriever
+from phase2.extraction import aextract_user_info
+from phase2.history import history_messages
+from phase2.context import assemble_context, CONTEXT_CANDIDATES, CONTEXT_SEPARATOR
+from phase2.tokens import count_tokens
+from phase2.session_store import session_store
+from phase2.log_tail import tail, read_since, parse_cursor
+from phase2.metrics import REGISTRY, REQUEST_SECONDS, FIRST_TOKEN_SECONDS, CONTEXT_TOKENS, ERRORS, Gauge
+from phase2.logger import logger, request_id_var, phase_var, LOG_FILE_PATH  # Import the logger
+
+
+# Knowledge base (Vector Store).
+# The index is memory-mapped from disk; only files changed since it was built are re-embedded.
+# Later changes to phase2_data are picked up by POST /admin/reload, or automatically
+# when KNOWLEDGE_WATCH_INTERVAL (seconds) is set.
+# With several workers (uvicorn --workers N) they all map the same index files and
+# only one of them builds; the watcher also carries a reload made by one worker to the others.
+BASE_DIR = Path(__file__).parent
+KNOWLEDGE = KnowledgeBase(BASE_DIR / ".." / "phase2_data")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The index is loaded in the background so the API accepts requests right away.
+    # collecting_info does not need retrieval; QA waits for /readyz.
+    logger.info("Starting up API...")
+    KNOWLEDGE.start_background_load()
+    KNOWLEDGE.start_watcher(float(os.getenv("KNOWLEDGE_WATCH_INTERVAL", "0")))
+    yield
+
+
+# Cache hit ratios are read from the caches when /metrics is scraped
+REGISTRY.register(Gauge(
+    "chatbot_cache_hit_ratio", "Hit ratio per cache.", "cache",
+    lambda: {
+        "query_embedding": query_cache.stats()["hit_ratio"],
+        "answer": answer_cache.stats()["hit_ratio"]
+    }
+))
 
 
 app = FastAPI(
     title="Medical Services Chatbot API",
     description="Stateless chatbot microservice for Israeli health funds",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
-# Load knowledge base (Vector Store) at startup
-logger.info("Starting up API...")
-BASE_DIR = Path(__file__).parent
-try:
-    VECTOR_STORE = load_knowledge(BASE_DIR / ".." / "phase2_data")
-    logger.info(f"Successfully loaded {len(VECTOR_STORE)} knowledge chunks.")
-except Exception as e:
-    logger.critical(f"Failed to load knowledge base: {e}")
-    VECTOR_STORE = []
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Every log record of a request carries its ID (taken from X-Request-ID when the client sends one)
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    request_id_var.set(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
 
 def is_profile_complete(profile) -> bool:
@@ -44,144 +89,480 @@ def is_profile_complete(profile) -> bool:
     ])
 
 
-def cosine_similarity(v1: list[float], v2: list[float]) -> float:
-    dot_product = sum(a * b for a, b in zip(v1, v2))
-    magnitude1 = math.sqrt(sum(a * a for a in v1))
-    magnitude2 = math.sqrt(sum(b * b for b in v2))
-    
-    if magnitude1 == 0 or magnitude2 == 0:
-        return 0.0
-        
-    return dot_product / (magnitude1 * magnitude2)
+def search_knowledge(query: str, top_k: int = CONTEXT_CANDIDATES, hmo: str = None, tier: str = None,
+                     retriever: Retriever = None, embed=get_query_embedding) -> str:
+    #Hybrid search over the partitions of the user's HMO and tier (plus general content).
+    #The query is embedded only if the lexical match is not conclusive
+    #(repeated questions are served from the embedding cache)
+    retriever = retriever or KNOWLEDGE.retriever
+    results = retriever.search(query, embed=embed, top_k=top_k, hmo=hmo, tier=tier)
+    return format_results(query, results, hmo, tier)
 
 
-def search_knowledge(query: str, top_k: int = 3) -> str:
-    #Embed the user query
-    query_vector = get_embedding(query)
-    
-    #Calculate similarity with all chunks
-    scored_chunks = []
-    for item in VECTOR_STORE:
-        score = cosine_similarity(query_vector, item["embedding"])
-        scored_chunks.append((score, item["text"]))
+def format_results(query: str, results, hmo: str = None, tier: str = None) -> str:
+    # Only the relevant, non-redundant part of the results goes into the prompt,
+    # within the context token budget, without the lines for other HMOs and tiers
+    top_chunks = assemble_context(results, hmo=hmo, tier=tier)
+    tokens = sum(count_tokens(text) for text in top_chunks)
+    CONTEXT_TOKENS.observe(tokens)
+
+    # The query itself is not logged, it may contain personal details
+    logger.info(f"Knowledge Search: Kept {len(top_chunks)} of {len(results)} chunks ({tokens} tokens) for a {len(query)}-character query | Query cache hit ratio: {query_cache.stats()['hit_ratio']:.0%}")
+    return CONTEXT_SEPARATOR.join(top_chunks)
+
+
+ERROR_REPLY = "אירעה שגיאה במערכת. אנא נסה שנית מאוחר יותר.\nAn error occurred. Please try again later."
+
+
+async def timed(awaitable):
+    # Returns (result, seconds taken) of an awaitable
+    start_time = time.time()
+    result = await awaitable
+    return result, time.time() - start_time
+
+
+def check_ready(user_profile) -> None:
+    # QA needs the knowledge base. Fail clearly instead of answering without context.
+    if is_profile_complete(user_profile) and not KNOWLEDGE.ready:
+        logger.warning(f"QA request rejected, knowledge base not ready: {KNOWLEDGE.status_info()}")
+        raise HTTPException(
+            status_code=503,
+            detail="Knowledge base is still loading. Please try again shortly.",
+            headers={"Retry-After": "10"}
+        )
+
+
+def llm_history(history) -> list:
+    # Chat messages as sent to the LLM (the phase marker is ours only)
+    return [{"role": msg.role, "content": msg.content} for msg in history]
+
+
+def qa_history(history):
+    # The QA turns of the conversation, or None if the client did not mark the phase of every message
+    if any(msg.phase is None for msg in history):
+        return None
+    return [msg for msg in history if msg.phase == "qa"]
+
+
+def collection_messages(request: ChatRequest) -> list:
+    system_prompt = user_information_collection_prompt(request.language)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    # Older turns are summarized so the prompt stays within the phase budget
+    messages.extend(history_messages(llm_history(request.conversation_history), "collecting_info"))
+    messages.append({"role": "user", "content": request.message})
+    return messages
+
+
+def merge_fields(user_profile, extracted_fields: dict) -> str:
+    # Fills the missing profile fields and returns the next phase
+    if extracted_fields:
+        logger.info(f"Extracted fields: {list(extracted_fields.keys())}")
     
-    #Sort by score descending
-    scored_chunks.sort(key=lambda x: x[0], reverse=True)
+    for field, value in extracted_fields.items():
+        if getattr(user_profile, field) is None and value is not None:
+            setattr(user_profile, field, value)
+
+    next_phase = "qa" if is_profile_complete(user_profile) else "collecting_info"
     
-    #Take top K chunks
-    top_chunks = [chunk for score, chunk in scored_chunks[:top_k]]
+    if next_phase == "qa":
+        logger.info("User profile completed. Transitioning to QA phase.")
+    return next_phase
+
+
+async def prepare_qa(request: ChatRequest):
+    """
+    Retrieves the context of a QA turn.
+    Returns (cached_reply, messages, remember): 'cached_reply' is set on an answer
+    cache hit, otherwise 'messages' go to the LLM and remember(reply) caches its answer.
+    """
+    user_profile = request.user_profile
+
+    # One knowledge snapshot for the whole request, even if a reload swaps it meanwhile
+    retriever = KNOWLEDGE.retriever
+    version = retriever.store.version
+
+    # BM25 first: a question the lexical match answers confidently is never embedded.
+    # Otherwise it is embedded once, for both the answer cache and the vector search.
+    lexical = retriever.lexical_stage(
+        request.message, CONTEXT_CANDIDATES, hmo=user_profile.hmo, tier=user_profile.insurance_tier
+    )
+    query_vector = None
+    if lexical[2] is None:
+        query_vector = await aget_query_embedding(request.message)
+
+    # When the phases are known, the LLM only sees the QA turns: the HMO and tier are in
+    # <user_context>, and a reply that never saw the name or ID can be given to other users
+    qa_turns = qa_history(request.conversation_history)
+    history = llm_history(qa_turns if qa_turns is not None else request.conversation_history)
+
+    remember = lambda reply: None
+
+    # Answer cache: the same question (or a near-identical one, when it was embedded)
+    # after the same QA turns, from a user with the same HMO, tier and language,
+    # is answered without calling the LLM
+    if ANSWER_CACHE_ENABLED and qa_turns is not None:
+        cache_key = (
+            *profile_key(user_profile.hmo, user_profile.insurance_tier, request.language),
+            history_key(history)
+        )
+
+        def remember(reply):
+            answer_cache.store(cache_key, query_vector, version, reply, text=request.message)
+
+        cached_reply = answer_cache.lookup(cache_key, query_vector, version, text=request.message)
+        if cached_reply is not None:
+            return cached_reply, None, remember
+
+    # Search for relevant information based on user message
+    if lexical[2] is not None:
+        results = lexical[2]
+    else:
+        results = retriever.vector_stage(query_vector, lexical, CONTEXT_CANDIDATES)
+    relevant_context = format_results(request.message, results, user_profile.hmo, user_profile.insurance_tier)
+
+    if not relevant_context:
+        logger.warning("No relevant context found in Vector Store.")
+        relevant_context = "No specific information found in the knowledge base."
+
+    # Inject context + User HMO info into prompt using XML tags for security
+    hmo_info = (
+        f"<user_context>"
+        f"<hmo>{user_profile.hmo}</hmo>"
+        f"<tier>{user_profile.insurance_tier}</tier>"
+        f"</user_context>"
+    )
     
-    logger.info(f"Knowledge Search: Found {len(top_chunks)} chunks for query: '{query}'")
-    return "\n\n---\n\n".join(top_chunks)
+    combined_context = (
+        f"{hmo_info}\n\n"
+        f"<retrieved_knowledge>\n{relevant_context}\n</retrieved_knowledge>"
+    )
+
+    system_prompt = qa_prompt(request.language, combined_context)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history_messages(history, "qa"))
+    messages.append({"role": "user", "content": request.message})
+    return None, messages, remember
+
+
+@app.post("/session")
+def create_session(request: SessionRequest):
+    """
+    Starts a server-side session. Later requests send only 'message', 'language'
+    and the returned 'session_id'; the server keeps the profile and history.
+    """
+    session_id = session_store.create(
+        request.user_profile,
+        [msg.model_dump() for msg in request.conversation_history]
+    )
+    return {"session_id": session_id}
+
+
+async def open_session(request: ChatRequest) -> ChatRequest:
+    # In session mode, fills the request with the profile and history kept on the server
+    # (the store may read SQLite, so it runs in a thread)
+    if not request.session_id:
+        return request
+
+    session = await asyncio.to_thread(session_store.get, request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+
+    # Stored state is already valid, skip re-validating it
+    return ChatRequest.model_construct(
+        message=request.message,
+        language=request.language,
+        session_id=request.session_id,
+        user_profile=session["user_profile"],
+        conversation_history=[ChatMessage.model_construct(**msg) for msg in session["conversation_history"]]
+    )
+
+
+async def close_session(request: ChatRequest, response: ChatResponse, phase: str) -> None:
+    # In session mode, stores the turn (sent in 'phase') and the updated profile
+    if not request.session_id:
+        return
+
+    def store_turn():
+        session = session_store.get(request.session_id) or {"conversation_history": []}
+        session["user_profile"] = response.updated_user_profile
+        session["conversation_history"].extend([
+            {"role": "user", "content": request.message, "phase": phase},
+            {"role": "assistant", "content": response.reply, "phase": phase}
+        ])
+        session_store.save(request.session_id, session)
+
+    await asyncio.to_thread(store_turn)
+    response.session_id = request.session_id
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     start_time = time.time()
+    request = await open_session(request)
     user_profile = request.user_profile
+    phase = "qa" if is_profile_complete(user_profile) else "collecting_info"
+    phase_var.set(phase)
     
     logger.info(f"Incoming request | User ID: {user_profile.id_number or 'Unknown'} | Phase: { 'QA' if is_profile_complete(user_profile) else 'Collection' }")
 
+    check_ready(user_profile)
+
     try:
-        #Collect User Info
-        if not is_profile_complete(user_profile):
-            system_prompt = user_information_collection_prompt(request.language)
+        response = await answer(request, start_time)
+    except Exception as e:
+        ERRORS.inc(stage="chat")
+        logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
+        # Return a polite error message to the user instead of crashing
+        return ChatResponse(
+            reply=ERROR_REPLY,
+            updated_user_profile=user_profile,
+            next_phase="collecting_info" if not is_profile_complete(user_profile) else "qa",
+            session_id=request.session_id
+        )
+    finally:
+        REQUEST_SECONDS.observe(time.time() - start_time, endpoint="/chat", phase=phase)
 
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend([msg.model_dump() for msg in request.conversation_history])
-            messages.append({"role": "user", "content": request.message})
+    await close_session(request, response, phase)
+    return response
 
-            assistant_reply = call_llm(messages)
-            
-            extracted_fields = extract_user_info(
-                message=request.message,
-                language=request.language
-            )
-            
-            if extracted_fields:
-                logger.info(f"Extracted fields: {list(extracted_fields.keys())}")
-            
-            for field, value in extracted_fields.items():
-                if getattr(user_profile, field) is None and value is not None:
-                    setattr(user_profile, field, value)
-
-            next_phase = "qa" if is_profile_complete(user_profile) else "collecting_info"
-            
-            if next_phase == "qa":
-                logger.info("User profile completed. Transitioning to QA phase.")
-            
-            return ChatResponse(
-                reply=assistant_reply,
-                updated_user_profile=user_profile,
-                next_phase=next_phase
-            )
 
-        #Q&A with RAG
-        
-        # Search for relevant information based on user message
-        relevant_context = search_knowledge(request.message)
-
-        if not relevant_context:
-            logger.warning("No relevant context found in Vector Store.")
-            relevant_context = "No specific information found in the knowledge base."
-
-        # Inject context + User HMO info into prompt using XML tags for security
-        hmo_info = (
-            f"<user_context>"
-            f"<hmo>{user_profile.hmo}</hmo>"
-            f"<tier>{user_profile.insurance_tier}</tier>"
-            f"</user_context>"
+async def answer(request: ChatRequest, start_time: float) -> ChatResponse:
+    user_profile = request.user_profile
+
+    #Collect User Info
+    if not is_profile_complete(user_profile):
+        # The reply and the field extraction are independent LLM calls, run them concurrently
+        stage_start = time.time()
+        (assistant_reply, reply_time), (extracted_fields, extraction_time) = await asyncio.gather(
+            timed(acall_llm(collection_messages(request))),
+            timed(aextract_user_info(message=request.message, language=request.language, user_profile=user_profile))
         )
-        
-        combined_context = (
-            f"{hmo_info}\n\n"
-            f"<retrieved_knowledge>\n{relevant_context}\n</retrieved_knowledge>"
+        total_time = time.time() - stage_start
+        logger.info(
+            f"Collection stages: reply {reply_time:.2f}s, extraction {extraction_time:.2f}s, "
+            f"total {total_time:.2f}s",
+            extra={"timings": {"reply": reply_time, "extraction": extraction_time, "total": total_time}}
         )
 
-        system_prompt = qa_prompt(request.language, combined_context)
-
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend([msg.model_dump() for msg in request.conversation_history])
-        messages.append({"role": "user", "content": request.message})
-
-        assistant_reply = call_llm(messages)
-
-        logger.info(f"Request processed successfully in {time.time() - start_time:.2f}s")
+        next_phase = merge_fields(user_profile, extracted_fields)
         
         return ChatResponse(
             reply=assistant_reply,
             updated_user_profile=user_profile,
+            next_phase=next_phase
+        )
+
+    #Q&A with RAG
+    cached_reply, messages, remember = await prepare_qa(request)
+    if cached_reply is not None:
+        total_time = time.time() - start_time
+        logger.info(f"Answer cache hit, request served in {total_time:.2f}s", extra={"timings": {"total": total_time}})
+        return ChatResponse(
+            reply=cached_reply,
+            updated_user_profile=user_profile,
             next_phase="qa"
         )
 
+    assistant_reply = await acall_llm(messages)
+    remember(assistant_reply)
+
+    total_time = time.time() - start_time
+    logger.info(f"Request processed successfully in {total_time:.2f}s", extra={"timings": {"total": total_time}})
+    
+    return ChatResponse(
+        reply=assistant_reply,
+        updated_user_profile=user_profile,
+        next_phase="qa"
+    )
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same as /chat, but streams the reply as Server-Sent Events:
+    "token" events carry {"text": ...} as the LLM produces it, and a final
+    "done" event (or "error") carries the full ChatResponse.
+    """
+    request = await open_session(request)
+    phase_var.set("qa" if is_profile_complete(request.user_profile) else "collecting_info")
+    logger.info(f"Incoming stream request | User ID: {request.user_profile.id_number or 'Unknown'} | Phase: { 'QA' if is_profile_complete(request.user_profile) else 'Collection' }")
+
+    check_ready(request.user_profile)
+    return StreamingResponse(stream_chat(request), media_type="text/event-stream")
+
+
+async def stream_chat(request: ChatRequest):
+    start_time = time.time()
+    first_token_time = None
+    user_profile = request.user_profile
+    phase = "qa" if is_profile_complete(user_profile) else "collecting_info"
+    extraction = None
+    parts = []
+
+    try:
+        if not is_profile_complete(user_profile):
+            # Extraction runs while the reply streams
+            extraction = asyncio.create_task(
+                aextract_user_info(message=request.message, language=request.language, user_profile=user_profile)
+            )
+            messages = collection_messages(request)
+            cached_reply = None
+        else:
+            cached_reply, messages, remember = await prepare_qa(request)
+
+        if cached_reply is not None:
+            logger.info("Answer cache hit")
+            parts.append(cached_reply)
+            yield sse_event("token", {"text": cached_reply})
+        else:
+            async for token in astream_llm(messages):
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                    FIRST_TOKEN_SECONDS.observe(first_token_time, phase=phase)
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+
+        assistant_reply = "".join(parts)
+        if extraction is not None:
+            next_phase = merge_fields(user_profile, await extraction)
+        else:
+            next_phase = "qa"
+            if cached_reply is None:
+                remember(assistant_reply)
+
+        timings = {"total": time.time() - start_time}
+        if first_token_time is not None:
+            timings["first_token"] = first_token_time
+        logger.info(
+            f"Stream processed successfully in {timings['total']:.2f}s"
+            + (f", first token after {first_token_time:.2f}s" if first_token_time is not None else ""),
+            extra={"timings": timings}
+        )
+        response = ChatResponse(reply=assistant_reply, updated_user_profile=user_profile, next_phase=next_phase)
+        await close_session(request, response, phase)
+        yield sse_event("done", response.model_dump())
+
     except Exception as e:
-        logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
-        # Return a polite error message to the user instead of crashing
-        return ChatResponse(
-            reply="אירעה שגיאה במערכת. אנא נסה שנית מאוחר יותר.\nAn error occurred. Please try again later.",
+        ERRORS.inc(stage="chat_stream")
+        logger.error(f"Error processing chat stream: {str(e)}", exc_info=True)
+        response = ChatResponse(
+            reply=ERROR_REPLY,
             updated_user_profile=user_profile,
-            next_phase="collecting_info" if not is_profile_complete(user_profile) else "qa"
+            next_phase="collecting_info" if not is_profile_complete(user_profile) else "qa",
+            session_id=request.session_id
         )
+        yield sse_event("error", response.model_dump())
+
+    finally:
+        if extraction is not None and not extraction.done():
+            extraction.cancel()
+        REQUEST_SECONDS.observe(time.time() - start_time, endpoint="/chat/stream", phase=phase)
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: request and stage latency histograms, token counts,
+    cache hit ratios and error counts.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness probe: 200 once the knowledge base can serve QA requests, 503 before.
+    Includes the index build status and embedding progress.
+    """
+    info = KNOWLEDGE.status_info()
+    return JSONResponse(status_code=200 if info["ready"] else 503, content=info)
+
+
+def valid_cursor(cursor) -> bool:
+    # Missing or malformed cursors (e.g. from an older client) start from the tail
+    try:
+        parse_cursor(cursor)
+        return True
+    except (AttributeError, ValueError):
+        return False
+
+
 @app.get("/logs")
-def get_logs(access: str = None):
+def get_logs(access: str = None, cursor: str = None):
     """
     Returns logs ONLY if the correct access key is provided in the URL.
     Usage: /logs?access=admin
+    Without a cursor, returns the last 50 lines. With the 'cursor' of the previous
+    response, returns only the lines written since (/logs?access=admin&cursor=<cursor>),
+    across log rotations.
     """
     # Validate the access token. In a production environment, use environment variables for secrets.
     if access != "admin":
         return {"logs": ["Logs Not Available (Access Denied)."]}
     
     # If access is granted, proceed to read the log file
-    log_file_path = Path(__file__).parent / ".." / "logs" / "chatbot.log"
-    
-    if not log_file_path.exists():
+    if not LOG_FILE_PATH.exists():
         return {"logs": ["Log file not created yet."]}
         
     try:
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            # Return last 50 lines to avoid payload being too large
-            return {"logs": lines[-50:]}
+        # Both reads seek, they never scan the whole file
+        if not valid_cursor(cursor):
+            lines, cursor = tail(LOG_FILE_PATH, 50)
+        else:
+            lines, cursor = read_since(LOG_FILE_PATH, cursor)
+        return {"logs": lines, "cursor": cursor}
+    except Exception as e:
+        return {"logs": [f"Error reading logs: {str(e)}"]}
+
+
+@app.get("/logs/follow")
+async def follow_logs(request: Request, access: str = None, cursor: str = None):
+    """
+    Streams new log lines as Server-Sent Events ("log" events with {"lines", "cursor"}).
+    Usage: /logs/follow?access=admin
+    """
+    if access != "admin":
+        raise HTTPException(status_code=403, detail="Access Denied.")
+
+    async def events(cursor):
+        while not await request.is_disconnected():
+            if LOG_FILE_PATH.exists():
+                if not valid_cursor(cursor):
+                    lines, cursor = tail(LOG_FILE_PATH, 50)
+                else:
+                    lines, cursor = read_since(LOG_FILE_PATH, cursor)
+                if lines:
+                    yield sse_event("log", {"lines": lines, "cursor": cursor})
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(events(cursor), media_type="text/event-stream")
+
+
+@app.post("/admin/reload")
+def reload_knowledge(access: str = None):
+    """
+    Re-indexes changed files in phase2_data and swaps the new index in without a restart.
+    Usage: POST /admin/reload?access=admin
+    """
+    if access != "admin":
+        return {"status": "Access Denied."}
+
+    try:
+        return KNOWLEDGE.reload()
     except Exception as e:
-        return {"logs": [f"Error reading logs: {str(e)}"]}
\ No newline at end of file
+        logger.error(f"Knowledge reload failed: {e}", exc_info=True)
+        return {"status": "failed", "error": str(e)}
@@ -0,0 +1,127 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from phase2.lexical import tokenize
+from phase2.metadata import drop_other_profiles
+from phase2.tokens import count_tokens
+
+
+# Chunks retrieved per question; assembly then keeps the useful ones
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+# At most this many chunks and tokens of retrieved knowledge go into the QA prompt
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "3"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+
+# Chunks scoring below this share of the best chunk's score are dropped.
+# Scores come from different scales (hybrid, BM25 only), so the threshold is relative.
+CONTEXT_MIN_RELATIVE_SCORE = float(os.getenv("CONTEXT_MIN_RELATIVE_SCORE", "0.5"))
+# Word overlap (Jaccard) above which a chunk counts as a duplicate of one already kept
+CONTEXT_DUPLICATE_OVERLAP = float(os.getenv("CONTEXT_DUPLICATE_OVERLAP", "0.8"))
+# Maximal marginal relevance: 1.0 ranks by relevance only, lower values favour diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+SPACES_RE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Collapses runs of spaces and blank lines (HTML text extraction leaves many),
+    keeping single line breaks, which carry list and table structure.
+    """
+    lines = (SPACES_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return BLANK_LINES_RE.sub("\n", "\n".join(lines)).strip()
+
+
+def overlap(a: frozenset, b: frozenset) -> float:
+    """
+    Jaccard similarity of two term sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """
+    The longest prefix of whole lines that fits in 'budget' tokens
+    (the first line is cut by characters if even it does not fit).
+    """
+    kept, used = [], 0
+    for line in text.split("\n"):
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+
+    if kept:
+        return "\n".join(kept)
+
+    line = text.split("\n", 1)[0]
+    return line[:max(0, len(line) * budget // max(1, count_tokens(line)))]
+
+
+def assemble_context(results: List[Tuple[float, Dict]], budget: int = CONTEXT_TOKEN_BUDGET,
+                     max_chunks: int = CONTEXT_MAX_CHUNKS,
+                     min_relative_score: float = CONTEXT_MIN_RELATIVE_SCORE,
+                     duplicate_overlap: float = CONTEXT_DUPLICATE_OVERLAP,
+                     mmr_lambda: float = MMR_LAMBDA, hmo: Optional[str] = None,
+                     tier: Optional[str] = None) -> List[str]:
+    """
+    Picks the chunk texts to put in the QA prompt from retrieval results
+    ((score, chunk) pairs, best first).
+
+    Lines about other HMOs and tiers than the user's 'hmo' and 'tier' are
+    removed (see metadata.drop_other_profiles), texts are whitespace-normalized, chunks far below the best score and
+    near-duplicates of a kept chunk are dropped, and the rest are chosen by
+    maximal marginal relevance (relevance minus overlap with what is already
+    kept) until 'max_chunks' or the token budget is reached. A chunk that does
+    not fit is skipped, except the first one, which is truncated to the budget.
+    """
+    if not results or budget <= 0 or max_chunks <= 0:
+        return []
+
+    best = max(score for score, _ in results)
+    candidates = []
+    for score, chunk in results:
+        if best > 0 and score < min_relative_score * best:
+            continue
+        text = normalize_whitespace(drop_other_profiles(chunk["text"], hmo, tier))
+        if text:
+            relevance = score / best if best > 0 else 0.0
+            candidates.append((relevance, text, frozenset(tokenize(text))))
+
+    selected: List[str] = []
+    selected_terms: List[frozenset] = []
+    used = 0
+
+    def marginal(candidate):
+        redundancy = max((overlap(candidate[2], terms) for terms in selected_terms), default=0.0)
+        return mmr_lambda * candidate[0] - (1 - mmr_lambda) * redundancy
+
+    while candidates and len(selected) < max_chunks:
+        candidate = max(candidates, key=marginal)
+        candidates.remove(candidate)
+        _, text, terms = candidate
+
+        if any(overlap(terms, kept) >= duplicate_overlap for kept in selected_terms):
+            continue
+
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            if selected:
+                continue
+            text = truncate_to_tokens(text, budget)
+            tokens = count_tokens(text)
+            if not text:
+                break
+
+        selected.append(text)
+        selected_terms.append(terms)
+        used += tokens
+
+    return selected
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from phase2.llm_client import get_embedding, aget_embedding, EMBEDDING_MODEL
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a query used as cache key.
+    Case, repeated whitespace and trailing punctuation do not change the embedding we want.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ?!.,;:")
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings.
+
+    Bounded both by number of entries and by the memory held by the vectors.
+    If 'disk_path' is set, entries are also written to a SQLite file and
+    read back on a memory miss, so the cache survives restarts. The file is
+    bounded too: rows not used for 'disk_max_age' seconds are deleted, and the
+    least recently used ones beyond 'disk_max_entries'.
+
+    get() and put() do blocking file I/O when the disk tier is on; async
+    callers use aget() and aput(), which run it in a thread.
+    """
+
+    # Disk rows are pruned every this many writes
+    PRUNE_EVERY = 256
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 100000,
+                 disk_max_age: float = 30 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_age = disk_max_age
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Separate lock, so memory hits never wait for disk I/O
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if disk_path:
+            # Several workers may share the file: wait for their locks instead of failing
+            self._db = sqlite3.connect(disk_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT, query TEXT, vector BLOB, used REAL, PRIMARY KEY (model, query))"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")]
+            if "used" not in columns:
+                # File written before the disk tier was bounded
+                self._db.execute("ALTER TABLE query_embeddings ADD COLUMN used REAL")
+                self._db.execute("UPDATE query_embeddings SET used = ?", (time.time(),))
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_used ON query_embeddings (used)")
+            self._prune()
+            self._db.commit()
+
+    def get(self, query: str, model: str) -> Optional[np.ndarray]:
+        key = (model, normalize_query(query))
+        vector = self._memory_get(key)
+        if vector is None:
+            vector = self._disk_get(key)
+        return vector
+
+    async def aget(self, query: str, model: str) -> Optional[np.ndarray]:
+        """
+        get() with the disk lookup run in a thread.
+        """
+        key = (model, normalize_query(query))
+        vector = self._memory_get(key)
+        if vector is None:
+            if self._db is not None:
+                vector = await asyncio.to_thread(self._disk_get, key)
+            else:
+                vector = self._disk_get(key)
+        return vector
+
+    def put(self, query: str, model: str, vector) -> np.ndarray:
+        key = (model, normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._insert(key, vector)
+        self._disk_put(key, vector)
+        return vector
+
+    async def aput(self, query: str, model: str, vector) -> np.ndarray:
+        """
+        put() with the disk write run in a thread.
+        """
+        key = (model, normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._insert(key, vector)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, vector)
+        return vector
+
+    def _memory_get(self, key: tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return vector
+
+    def _disk_get(self, key: tuple) -> Optional[np.ndarray]:
+        row = None
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?", key
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE query_embeddings SET used = ? WHERE model = ? AND query = ?",
+                        (time.time(), *key)
+                    )
+                    self._db.commit()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._insert(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def _disk_put(self, key: tuple, vector: np.ndarray) -> None:
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, used) VALUES (?, ?, ?, ?)",
+                (*key, vector.tobytes(), time.time())
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self) -> None:
+        # Caller holds the database lock (or is the constructor)
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE used < ?", (time.time() - self.disk_max_age,)
+        )
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE rowid IN ("
+            "SELECT rowid FROM query_embeddings ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+
+    def _insert(self, key: tuple, vector: np.ndarray) -> None:
+        # Caller holds the lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._entry_size(key, old)
+
+        self._entries[key] = vector
+        self._bytes += self._entry_size(key, vector)
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            old_key, old_vector = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(old_key, old_vector)
+
+    @staticmethod
+    def _entry_size(key: tuple, vector: np.ndarray) -> int:
+        return vector.nbytes + len(key[1].encode("utf-8"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+
+# Shared cache for the QA path. Set QUERY_CACHE_PATH to enable the on-disk tier.
+query_cache = QueryEmbeddingCache(
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "32")) * 1024 * 1024),
+    disk_path=os.getenv("QUERY_CACHE_PATH") or None,
+    disk_max_entries=int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "100000")),
+    disk_max_age=float(os.getenv("QUERY_CACHE_DISK_MAX_DAYS", "30")) * 24 * 3600
+)
+
+
+def get_query_embedding(query: str) -> np.ndarray:
+    """
+    Embeds a user query, serving repeated questions from the cache.
+    """
+    vector = query_cache.get(query, EMBEDDING_MODEL)
+    if vector is None:
+        vector = query_cache.put(query, EMBEDDING_MODEL, get_embedding(query))
+    return vector
+
+
+async def aget_query_embedding(query: str) -> np.ndarray:
+    """
+    Async version of get_query_embedding.
+    """
+    vector = await query_cache.aget(query, EMBEDDING_MODEL)
+    if vector is None:
+        vector = await query_cache.aput(query, EMBEDDING_MODEL, await aget_embedding(query))
+    return vector
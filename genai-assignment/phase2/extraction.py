@@ -1,7 +1,11 @@
 import json
-from typing import Dict, Any
-from phase2.llm_client import call_llm
+from typing import Dict, Any, Optional
+from phase2.llm_client import call_llm, acall_llm
+from phase2.lexical import words, expand_word
+from phase2.metadata import canonical_hmo, canonical_tier
 from phase2.schemas import UserProfile
+from phase2.metrics import stage, EXTRACTIONS
+from phase2.logger import logger
 
 def user_info_extraction_prompt(language: str) -> str:
     """
@@ -41,19 +45,18 @@ def user_info_extraction_prompt(language: str) -> str:
         2. החזר רק את ה-JSON. ללא מרקדאון.
         """
 
-def extract_user_info(message: str, language: str) -> Dict[str, Any]:
-    """
-    Extracts structured user information from a single user message.
-    """
+def _extraction_messages(message: str, language: str) -> list[dict]:
     system_prompt = user_info_extraction_prompt(language)
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": f"User message:\n{message}"}
     ]
 
-    response = call_llm(messages)
-
+def parse_extraction(response: str) -> Dict[str, Any]:
+    """
+    Parses the extractor's JSON reply and keeps only valid UserProfile fields.
+    """
     try:
         # Clean markdown if present
         text = response.replace("```json", "").replace("```", "").strip()
@@ -64,6 +67,12 @@ def extract_user_info(message: str, language: str) -> Dict[str, Any]:
     if not isinstance(extracted, dict):
         return {}
 
+    return clean_fields(extracted)
+
+def clean_fields(extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validation applied to extracted fields, from the LLM or the local extractor.
+    """
     # Allow known UserProfile fields
     allowed_fields = set(UserProfile.model_fields.keys())
     cleaned: Dict[str, Any] = {}
@@ -82,4 +91,143 @@ def extract_user_info(message: str, language: str) -> Dict[str, Any]:
         
         cleaned[field] = value
 
-    return cleaned
\ No newline at end of file
+    return cleaned
+
+# Local extraction: values written to the profile, in the language of the conversation
+LOCAL_VALUES = {
+    "he": {
+        "maccabi": "מכבי", "meuhedet": "מאוחדת", "clalit": "כללית",
+        "gold": "זהב", "silver": "כסף", "bronze": "ארד",
+        "male": "זכר", "female": "נקבה"
+    },
+    "en": {
+        "maccabi": "Maccabi", "meuhedet": "Meuhedet", "clalit": "Clalit",
+        "gold": "Gold", "silver": "Silver", "bronze": "Bronze",
+        "male": "Male", "female": "Female"
+    }
+}
+
+GENDER_WORDS = {
+    "male": ["זכר", "גבר", "male", "man"],
+    "female": ["נקבה", "אישה", "אשה", "female", "woman"],
+}
+
+# Words that tell which 9-digit number the user means
+ID_WORDS = {"זהות", "תז", "id"}
+CARD_WORDS = {"כרטיס", "card"}
+
+# Words that carry no profile information, a message made only of these and
+# recognized values needs no LLM
+FILLER_WORDS = (
+    "אני שלי שמי זה זו הוא היא גיל שנים שנה בן בת קופה קופת קופח חולים ביטוח רמת רמה "
+    "מסלול מספר כרטיס תעודת זהות ת ז תז מין כן נכון יש לי אצל חבר חברה מבוטח מבוטחת סוג "
+    "i im m am my is it its s the a an and years year old age aged id number no card "
+    "hmo health fund tier level insurance plan gender sex member of with at in yes"
+)
+
+def _word_set(text: str) -> set:
+    return set(words(text))
+
+_GENDER_LOOKUP = {word: key for key, names in GENDER_WORDS.items() for word in _word_set(" ".join(names))}
+_FILLER_LOOKUP = _word_set(FILLER_WORDS)
+_ID_LOOKUP = _word_set(" ".join(ID_WORDS))
+_CARD_LOOKUP = _word_set(" ".join(CARD_WORDS))
+
+def extract_locally(message: str, language: str, user_profile: Optional[UserProfile] = None):
+    """
+    Rule-based extraction of IDs, card numbers, age, HMO, tier and gender.
+
+    Returns (fields, complete). 'complete' is False when the message has words
+    that are not recognized (names, free text) or ambiguous values; the LLM
+    must then handle the message.
+    A 9-digit number is an ID or a card number according to the words next to
+    it ("תעודת זהות", "כרטיס"), or else the first of the two the profile is missing.
+    """
+    values = LOCAL_VALUES.get(language, LOCAL_VALUES["he"])
+    found = {"nine_digits": [], "age": [], "hmo": set(), "insurance_tier": set(), "gender": set()}
+    id_mentioned = card_mentioned = False
+    complete = True
+
+    for word in words(message):
+        variants = expand_word(word)
+
+        if word.isdigit():
+            if len(word) == 9:
+                found["nine_digits"].append(word)
+            elif len(word) <= 3:
+                found["age"].append(int(word))
+            else:
+                complete = False
+        elif canonical_hmo(word):
+            found["hmo"].add(canonical_hmo(word))
+        elif canonical_tier(word):
+            found["insurance_tier"].add(canonical_tier(word))
+        elif any(v in _GENDER_LOOKUP for v in variants):
+            found["gender"].add(next(_GENDER_LOOKUP[v] for v in variants if v in _GENDER_LOOKUP))
+        elif any(v in _FILLER_LOOKUP for v in variants):
+            id_mentioned = id_mentioned or any(v in _ID_LOOKUP for v in variants)
+            card_mentioned = card_mentioned or any(v in _CARD_LOOKUP for v in variants)
+        else:
+            complete = False
+
+    fields: Dict[str, Any] = {}
+
+    for field in ("hmo", "insurance_tier", "gender"):
+        if len(found[field]) == 1:
+            fields[field] = values[found[field].pop()]
+        elif found[field]:
+            complete = False
+
+    if len(found["age"]) == 1:
+        fields["age"] = found["age"][0]
+    elif found["age"]:
+        complete = False
+
+    if len(found["nine_digits"]) == 1:
+        number = found["nine_digits"][0]
+        has_id = user_profile is not None and user_profile.id_number
+        has_card = user_profile is not None and user_profile.hmo_card_number
+
+        if id_mentioned != card_mentioned:
+            fields["id_number" if id_mentioned else "hmo_card_number"] = number
+        elif not id_mentioned and not has_id:
+            fields["id_number"] = number
+        elif not id_mentioned and not has_card:
+            fields["hmo_card_number"] = number
+        else:
+            complete = False
+    elif found["nine_digits"]:
+        complete = False
+
+    return clean_fields(fields), complete
+
+def extract_user_info(message: str, language: str, user_profile: Optional[UserProfile] = None) -> Dict[str, Any]:
+    """
+    Extracts structured user information from a single user message.
+    The LLM is called only if the local extractor cannot account for the whole message.
+    """
+    with stage("extraction"):
+        fields, complete = extract_locally(message, language, user_profile)
+        if complete:
+            logger.info(f"Local extraction: {list(fields.keys())}, LLM skipped.")
+            EXTRACTIONS.inc(path="local")
+            return fields
+
+        EXTRACTIONS.inc(path="llm")
+        response = call_llm(_extraction_messages(message, language))
+        return parse_extraction(response)
+
+async def aextract_user_info(message: str, language: str, user_profile: Optional[UserProfile] = None) -> Dict[str, Any]:
+    """
+    Async version of extract_user_info.
+    """
+    with stage("extraction"):
+        fields, complete = extract_locally(message, language, user_profile)
+        if complete:
+            logger.info(f"Local extraction: {list(fields.keys())}, LLM skipped.")
+            EXTRACTIONS.inc(path="local")
+            return fields
+
+        EXTRACTIONS.inc(path="llm")
+        response = await acall_llm(_extraction_messages(message, language))
+        return parse_extraction(response)
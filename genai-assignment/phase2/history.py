@@ -0,0 +1,84 @@
+import os
+import re
+from typing import Dict, List
+
+from phase2.tokens import count_tokens
+
+
+# Token budget for the conversation history sent to the LLM, per phase.
+# The system prompt (and retrieved context) is not counted, it is always sent in full.
+HISTORY_BUDGETS = {
+    "collecting_info": int(os.getenv("HISTORY_BUDGET_COLLECTION", "1500")),
+    "qa": int(os.getenv("HISTORY_BUDGET_QA", "2500")),
+}
+
+# Part of the budget reserved for the summary of older turns (0 drops them instead)
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Characters kept from each older message in the summary
+SUMMARY_LINE_CHARS = 160
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def summary_line(message: Dict) -> str:
+    """
+    Extractive summary of one message: its first sentence, shortened.
+    """
+    text = " ".join(message["content"].split())
+    text = SENTENCE_END_RE.split(text, maxsplit=1)[0]
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rstrip() + "..."
+    return f"{message['role']}: {text}"
+
+
+def fit_history(history: List[Dict], budget: int, summary_tokens: int = HISTORY_SUMMARY_TOKENS) -> List[Dict]:
+    """
+    Returns the part of 'history' that fits in 'budget' tokens.
+
+    The most recent messages are kept verbatim. Older ones are compacted into
+    one system message with the first sentence of each (newest first until
+    'summary_tokens' is used), or dropped when summary_tokens is 0.
+    Only the kept messages are tokenized, so the cost does not grow with the
+    length of the session.
+    """
+    if summary_tokens >= budget:
+        summary_tokens = 0
+
+    kept: List[Dict] = []
+    used = 0
+    for message in reversed(history):
+        tokens = count_tokens(message["content"])
+        if used + tokens > budget - summary_tokens:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+
+    dropped = history[:len(history) - len(kept)]
+    if not dropped or summary_tokens <= 0:
+        return kept
+
+    header = "Summary of the earlier conversation:"
+    lines: List[str] = []
+    used = count_tokens(header)
+    for message in reversed(dropped):
+        line = summary_line(message)
+        tokens = count_tokens(line)
+        if used + tokens > summary_tokens:
+            break
+        lines.append(line)
+        used += tokens
+
+    if not lines:
+        return kept
+
+    summary = "\n".join([header] + lines[::-1])
+    return [{"role": "system", "content": summary}] + kept
+
+
+def history_messages(history: List[Dict], phase: str) -> List[Dict]:
+    """
+    The conversation history to send to the LLM in a given phase.
+    """
+    return fit_history(history, HISTORY_BUDGETS[phase])
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from phase2.knowledge_loader import chunk_file, CHUNKER_VERSION
+from phase2.llm_client import get_embeddings, EMBEDDING_MODEL
+from phase2.vector_store import VectorStore, normalize_rows, partition_key
+from phase2.ann import create_backend
+from phase2.lexical import BM25Index
+from phase2.file_lock import file_lock
+from phase2.logger import logger
+
+
+DATA_DIR = Path(__file__).parent / ".." / "phase2_data"
+INDEX_DIR = Path(os.getenv("KNOWLEDGE_INDEX_DIR", Path(__file__).parent / ".." / "index"))
+
+# On-disk layout:
+#   index/CURRENT                     -> name of the active version directory
+#   index/<version>/manifest.json     -> embedding model, source file hashes, chunk texts and metadata
+#   index/<version>/embeddings.npy    -> normalized float32 matrix, row i = chunks[i]
+#   index/<version>/bm25-*            -> BM25 vocabulary and posting arrays (see phase2.lexical)
+#   index/<version>/ivf-<part>.npz    -> IVF lists per partition, only when RETRIEVAL_BACKEND=ivf
+#   index/.build.lock                 -> held by the process building, so workers build only once
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+LOCK_FILE = ".build.lock"
+
+# Version directories (and their temporary copies while written) are named by
+# index_version(). The index directory is configurable and may hold other
+# things, so only directories named like this are ever deleted.
+VERSION_DIR_RE = re.compile(r"\.?([0-9a-f]{16})(\.tmp)?")
+
+
+def text_hash(text: str) -> str:
+    """
+    Content hash used to decide whether a chunk needs a new embedding.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hashes(data_dir: Path) -> Dict[str, str]:
+    """
+    Content hash of every knowledge file, keyed by source name (file stem).
+    """
+    return {
+        html_file.stem: hashlib.sha256(html_file.read_bytes()).hexdigest()
+        for html_file in sorted(Path(data_dir).glob("*.html"))
+    }
+
+
+def index_version(chunks: List[Dict], files: Dict[str, str], model: str) -> str:
+    """
+    Short identifier of an index: changes whenever any source file, chunk, the chunker
+    or the embedding model changes.
+    """
+    digest = hashlib.sha256(f"{model}:{CHUNKER_VERSION}".encode("utf-8"))
+    for source, file_digest in sorted(files.items()):
+        digest.update(f"{source}:{file_digest}".encode("utf-8"))
+    for chunk in chunks:
+        digest.update(chunk["hash"].encode("utf-8"))
+        digest.update(chunk["source"].encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _current_version_dir(index_dir: Path) -> Optional[Path]:
+    pointer = index_dir / CURRENT_FILE
+    if not pointer.exists():
+        return None
+
+    version_dir = index_dir / pointer.read_text(encoding="utf-8").strip()
+    if not (version_dir / MANIFEST_FILE).exists():
+        return None
+    return version_dir
+
+
+def _is_version_dir(path: Path) -> bool:
+    match = VERSION_DIR_RE.fullmatch(path.name)
+    if match is None or not path.is_dir():
+        return False
+    # A finished version always has its manifest or matrix (the matrix is written first)
+    return bool(match.group(2)) or (path / MANIFEST_FILE).exists() or (path / EMBEDDINGS_FILE).exists()
+
+
+def current_version(index_dir: Path = INDEX_DIR) -> Optional[str]:
+    """
+    Version the CURRENT pointer names (a cheap check for an index written by another process).
+    """
+    try:
+        return (Path(index_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def build_lock(index_dir: Path = INDEX_DIR):
+    """
+    Exclusive lock on the index directory across processes. Every API worker
+    on the node loads the same index, so only the first one to get the lock
+    builds (and embeds), the others wait and then map what it wrote.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    with file_lock(index_dir / LOCK_FILE):
+        yield
+
+
+def load_index(index_dir: Path = INDEX_DIR, mmap: bool = True) -> Optional[VectorStore]:
+    """
+    Loads the active index from disk.
+    The embedding matrix and the BM25 arrays are memory-mapped read-only, so this
+    is instant regardless of their size, and all processes loading the same
+    version share one copy in the page cache.
+    The search backend (exact or ANN) is attached according to RETRIEVAL_BACKEND.
+    Returns None if there is no index or it was built with another embedding model.
+    """
+    version_dir = _current_version_dir(index_dir)
+    if version_dir is None:
+        return None
+
+    with open(version_dir / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest["embedding_model"] != EMBEDDING_MODEL:
+        logger.warning(
+            f"Knowledge index was built with '{manifest['embedding_model']}', "
+            f"expected '{EMBEDDING_MODEL}'. Ignoring it."
+        )
+        return None
+
+    matrix = np.load(version_dir / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+    store = VectorStore.from_normalized(
+        manifest["chunks"], matrix,
+        version=manifest["version"],
+        # Files chunked by another chunker version count as changed
+        files=manifest.get("files", {}) if manifest.get("chunker") == CHUNKER_VERSION else {}
+    )
+    store.lexical = BM25Index.load(version_dir, mmap=mmap)
+    store.use_backend(lambda part_matrix, name: create_backend(part_matrix, name, directory=version_dir))
+    return store
+
+
+def _write_index(index_dir: Path, version: str, files: Dict[str, str],
+                 chunks: List[Dict], matrix: np.ndarray) -> None:
+    """
+    Writes a new version directory (with the search backend files) and then
+    atomically repoints CURRENT at it.
+    Readers never see a half-written index.
+    """
+    version_dir = index_dir / version
+    tmp_dir = index_dir / f".{version}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    np.save(tmp_dir / EMBEDDINGS_FILE, matrix)
+    BM25Index.build([chunk["text"] for chunk in chunks]).save(tmp_dir)
+    # With RETRIEVAL_BACKEND=ivf the IVF lists are trained and saved here, under the
+    # build lock, so workers loading the index only read them
+    VectorStore.from_normalized(chunks, matrix).use_backend(
+        lambda part_matrix, name: create_backend(part_matrix, name, directory=tmp_dir)
+    )
+    with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "embedding_model": EMBEDDING_MODEL,
+            "dimension": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "chunker": CHUNKER_VERSION,
+            "files": files,
+            "chunks": chunks
+        }, f, ensure_ascii=False)
+
+    if version_dir.exists():
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    else:
+        os.replace(tmp_dir, version_dir)
+
+    pointer_tmp = index_dir / f"{CURRENT_FILE}.tmp"
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, index_dir / CURRENT_FILE)
+
+    # Remove older versions. Workers still serving one keep reading their mapped
+    # files after the unlink; on Windows mapped files may refuse to be deleted,
+    # they are cleaned up on the next build.
+    for old_dir in index_dir.iterdir():
+        if old_dir.name != version and _is_version_dir(old_dir):
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def build_index(data_dir: Path = DATA_DIR, index_dir: Path = INDEX_DIR,
+                on_progress: Optional[Callable[[int, int], None]] = None) -> VectorStore:
+    """
+    Chunks the knowledge files and writes the index to disk.
+    Files whose content hash is unchanged since the current index keep their
+    chunks without being re-parsed. Embeddings of chunks whose text hash already
+    exists are reused, only new or changed chunks are sent to the embedding API.
+    'on_progress(embedded, total)' reports embedding progress.
+
+    Runs under build_lock(): when another process has already built the index
+    for the current files while we waited, that index is returned as is.
+    """
+    with build_lock(index_dir):
+        return _build_index(Path(data_dir), Path(index_dir), on_progress)
+
+
+def _build_index(data_dir: Path, index_dir: Path,
+                 on_progress: Optional[Callable[[int, int], None]]) -> VectorStore:
+    previous = load_index(index_dir)
+    previous_files = previous.files if previous is not None else {}
+    files = file_hashes(data_dir)
+
+    if previous is not None and len(previous) and previous_files == files:
+        if previous.lexical is not None:
+            logger.info(f"Knowledge index {previous.version} is already up to date.")
+            return previous
+        # Written before the BM25 index was saved with it: add it in place
+        BM25Index.build([chunk["text"] for chunk in previous.chunks]).save(_current_version_dir(index_dir))
+        logger.info(f"Saved the BM25 index of knowledge index {previous.version}.")
+        return load_index(index_dir)
+
+    chunks = []
+    changed_files = []
+    for source, digest in files.items():
+        if previous_files.get(source) == digest:
+            chunks.extend(dict(chunk) for chunk in previous.chunks if chunk["source"] == source)
+            continue
+
+        changed_files.append(source)
+        for chunk in chunk_file(Path(data_dir) / f"{source}.html"):
+            chunk["hash"] = text_hash(chunk["text"])
+            chunks.append(chunk)
+
+    # Rows are written grouped by (hmo, tier) partition so each partition is a contiguous block
+    chunks.sort(key=partition_key)
+
+    # Embeddings we already have, by text hash
+    known_rows = {}
+    if previous is not None:
+        known_rows = {chunk["hash"]: i for i, chunk in enumerate(previous.chunks)}
+
+    new_texts = {}
+    for chunk in chunks:
+        if chunk["hash"] not in known_rows:
+            new_texts.setdefault(chunk["hash"], chunk["text"])
+
+    removed_files = sorted(set(previous_files) - set(files))
+    logger.info(
+        f"Building knowledge index: {len(chunks)} chunks, "
+        f"{len(chunks) - len(new_texts)} reused, {len(new_texts)} to embed. "
+        f"Changed files: {changed_files or 'none'}, removed files: {removed_files or 'none'}."
+    )
+
+    if on_progress is not None:
+        on_progress(0, len(new_texts))
+    new_vectors = dict(zip(
+        new_texts.keys(),
+        get_embeddings(list(new_texts.values()), on_progress=on_progress)
+    ))
+
+    if new_vectors:
+        dimension = len(next(iter(new_vectors.values())))
+    elif previous is not None and len(previous):
+        dimension = previous.matrix.shape[1]
+    else:
+        dimension = 0
+
+    matrix = np.zeros((len(chunks), dimension), dtype=np.float32)
+    for i, chunk in enumerate(chunks):
+        if chunk["hash"] in new_vectors:
+            matrix[i] = new_vectors[chunk["hash"]]
+        else:
+            matrix[i] = previous.matrix[known_rows[chunk["hash"]]]
+
+    matrix = normalize_rows(matrix).astype(np.float32)
+    version = index_version(chunks, files, EMBEDDING_MODEL)
+    _write_index(index_dir, version, files, chunks, matrix)
+
+    logger.info(f"Knowledge index {version} written to {index_dir}")
+    return load_index(index_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the phase2 knowledge index.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    args = parser.parse_args()
+
+    store = build_index(args.data_dir, args.index_dir)
+    print(f"Index {store.version} ready with {len(store)} chunks.")
@@ -0,0 +1,195 @@
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from phase2.index_store import build_index, load_index, current_version, file_hashes, DATA_DIR, INDEX_DIR
+from phase2.retriever import Retriever
+from phase2.vector_store import VectorStore
+from phase2.logger import logger
+
+
+# Backoff between attempts of a failed startup load
+LOAD_RETRY_BASE_SECONDS = 2.0
+LOAD_RETRY_MAX_SECONDS = 60.0
+
+
+class KnowledgeBase:
+    """
+    Holds the active knowledge snapshot (a Retriever over one VectorStore).
+
+    A reload builds the new index off to the side and then replaces
+    'self.retriever' with a single assignment. Requests read the attribute once
+    and keep using that snapshot, so an in-flight request never sees a
+    half-updated index.
+
+    'status' is one of "starting", "building", "ready" or "failed", and
+    'progress' counts embedded chunks during a build.
+
+    With several API workers each holds its own KnowledgeBase, but they all map
+    the same index files: builds are serialized by a lock on the index
+    directory (the first worker embeds, the others map its result), and sync()
+    picks up an index another worker wrote.
+    """
+
+    def __init__(self, data_dir: Path = DATA_DIR, index_dir: Path = INDEX_DIR):
+        self.data_dir = Path(data_dir)
+        self.index_dir = Path(index_dir)
+        self.retriever = Retriever(VectorStore.from_records([]))
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+
+        self.status = "starting"
+        self.error = None
+        self.progress = {"embedded": 0, "total": 0}
+
+    @property
+    def store(self) -> VectorStore:
+        return self.retriever.store
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once a non-empty index is being served (a rebuild may still be running).
+        """
+        return len(self.store) > 0
+
+    def status_info(self) -> Dict:
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "version": self.store.version,
+            "chunks": len(self.store),
+            "progress": dict(self.progress),
+            "error": self.error
+        }
+
+    def _on_progress(self, embedded: int, total: int) -> None:
+        self.progress = {"embedded": embedded, "total": total}
+
+    def start_background_load(self) -> None:
+        """
+        Runs load() in a daemon thread so the API can start serving immediately.
+        A failed load (e.g. an embedding outage) is retried with exponential
+        backoff until the knowledge base is ready.
+        """
+        def run():
+            delay = LOAD_RETRY_BASE_SECONDS
+            while True:
+                try:
+                    self.load()
+                    logger.info(f"Successfully loaded {len(self.store)} knowledge chunks.")
+                    return
+                except Exception as e:
+                    self.status = "failed"
+                    self.error = str(e)
+                    logger.critical(f"Failed to load knowledge base, retrying in {delay:.0f}s: {e}", exc_info=True)
+                time.sleep(delay)
+                delay = min(delay * 2, LOAD_RETRY_MAX_SECONDS)
+
+        threading.Thread(target=run, name="knowledge-loader", daemon=True).start()
+
+    def load(self) -> None:
+        """
+        Maps the index from disk and then brings it up to date with the data directory.
+        When nothing changed this does not parse or embed anything.
+        """
+        store = load_index(self.index_dir)
+        if store is not None:
+            self.retriever = Retriever(store)
+        self.reload()
+
+    def reload(self) -> Dict:
+        """
+        Re-indexes the files whose content hash changed and swaps the new snapshot in.
+        Returns a summary of what changed.
+        """
+        with self._reload_lock:
+            current = self.store
+            files = file_hashes(self.data_dir)
+
+            if files == current.files and len(current):
+                self.status = "ready"
+                return {"status": "unchanged", "version": current.version, "chunks": len(current)}
+
+            changed = sorted(
+                source for source in set(files) | set(current.files)
+                if files.get(source) != current.files.get(source)
+            )
+
+            start_time = time.time()
+            self.status = "building"
+            self.progress = {"embedded": 0, "total": 0}
+            try:
+                store = build_index(self.data_dir, self.index_dir, on_progress=self._on_progress)
+            except Exception as e:
+                self.status = "failed"
+                self.error = str(e)
+                raise
+
+            self.retriever = Retriever(store)
+            self.status = "ready"
+            self.error = None
+
+            logger.info(
+                f"Knowledge base reloaded in {time.time() - start_time:.2f}s: "
+                f"version {store.version}, {len(store)} chunks, changed files: {changed}"
+            )
+            return {
+                "status": "reloaded",
+                "version": store.version,
+                "chunks": len(store),
+                "changed_files": changed
+            }
+
+    def sync(self) -> bool:
+        """
+        Swaps in the index on disk if another process (e.g. another worker
+        handling /admin/reload) wrote a newer one. Returns True if it did.
+        """
+        version = current_version(self.index_dir)
+        if version is None or version == self.store.version:
+            return False
+
+        with self._reload_lock:
+            store = load_index(self.index_dir)
+            if store is None or store.version == self.store.version or not len(store):
+                return False
+            self.retriever = Retriever(store)
+            self.status = "ready"
+            self.error = None
+
+        logger.info(f"Knowledge base synced to version {store.version} written by another process.")
+        return True
+
+    def start_watcher(self, interval: float) -> None:
+        """
+        Polls the data directory every 'interval' seconds and reloads when a file
+        is added, removed or modified. Runs in a daemon thread.
+        It also syncs to index versions written by other workers.
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def signature():
+            return sorted(
+                (p.name, p.stat().st_mtime_ns, p.stat().st_size)
+                for p in self.data_dir.glob("*.html")
+            )
+
+        def watch():
+            last = signature()
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                    current = signature()
+                    if current != last:
+                        self.reload()
+                        last = current
+                except Exception as e:
+                    logger.error(f"Knowledge base watcher failed to reload: {e}", exc_info=True)
+
+        self._watcher = threading.Thread(target=watch, name="knowledge-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching {self.data_dir} for changes every {interval}s.")
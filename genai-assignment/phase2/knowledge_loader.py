@@ -1,9 +1,20 @@
+import os
+import re
 from pathlib import Path
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, Tag
 from typing import List, Dict
 
-# Import the embedding function
-from phase2.llm_client import get_embedding
+from phase2.metadata import tag_chunk, canonical_hmo
+from phase2.tokens import count_tokens
+
+
+# Token budget of a prose chunk (table rows are never split)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+
+# Stored in the index manifest; changing the chunking logic must change this
+# so that existing indexes re-chunk every file.
+CHUNKER_VERSION = f"structural-4-{CHUNK_MAX_TOKENS}"
+HEADINGS = ("h1", "h2", "h3", "h4", "h5", "h6")
 
 
 def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
@@ -29,51 +40,185 @@ def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     return chunks
 
 
-def load_knowledge(base_path: Path) -> List[Dict]:
+def block_text(node: Tag) -> str:
+    """
+    Visible text of an element with <br> kept as line breaks and whitespace collapsed.
+    """
+    for br in node.find_all("br"):
+        br.replace_with("\n")
+
+    lines = (re.sub(r"\s+", " ", line).strip() for line in node.get_text().split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _row_chunks(row: Tag, headers: List[str], context: str, group_hmo_columns: bool) -> List[str]:
+    """
+    The chunk for one table row. When the columns are HMOs (service x HMO tables),
+    the row's first cell names the service and every HMO cell follows under an
+    "HMO:" heading, so that the lines for other HMOs can be dropped from the
+    prompt (metadata.drop_other_profiles); otherwise the row is "header: value" pairs.
+    """
+    cells = [block_text(cell) for cell in row.find_all(["td", "th"], recursive=False)]
+    if not any(cells):
+        return []
+
+    headers = headers + [""] * (len(cells) - len(headers))
+    row_name = f"{headers[0]}: {cells[0]}" if headers[0] else cells[0]
+
+    if group_hmo_columns and len(cells) > 1 and all(canonical_hmo(h) for h in headers[1:len(cells)]):
+        blocks = [f"{header}:\n{cell}" for header, cell in zip(headers[1:], cells[1:]) if cell]
+        return ["\n".join([context, row_name, *blocks])]
+
+    pairs = [f"{h}: {c}" if h else c for h, c in zip(headers, cells) if c]
+    return [f"{context}\n" + "\n".join(pairs)]
+
+
+def chunk_html(soup: BeautifulSoup, group_hmo_columns: bool = True,
+               max_tokens: int = CHUNK_MAX_TOKENS) -> List[str]:
     """
-    Loads HTML files, chunks them, and generates embeddings for each chunk.
-    Returns a list of dicts (the "Vector Store").
+    Structure-aware chunking of a service page.
+
+    Walks the document in order and emits self-describing chunks, each prefixed
+    with the page title and current section heading:
+    - one chunk per table row (all HMO columns of a service together)
+    - one chunk per HMO for lists whose items are each about a single HMO
+      (phone numbers, links), merged across the sections of the page
+    - other paragraphs and lists packed into chunks of at most 'max_tokens'
+    """
+    root = soup.body or soup
+    title = ""
+    section = ""
+    chunks: List[str] = []
+    prose: List[str] = []
+    per_hmo: Dict[str, List[str]] = {}
+
+    def context() -> str:
+        return " | ".join(part for part in (title, section) if part)
+
+    def flush_prose():
+        if not prose:
+            return
+        header = context()
+        current = []
+        for block in prose:
+            candidate = "\n".join([header, *current, block])
+            if current and count_tokens(candidate) > max_tokens:
+                chunks.append("\n".join([header, *current]))
+                current = []
+            current.append(block)
+        chunks.append("\n".join([header, *current]))
+        prose.clear()
+
+    def visit(node):
+        nonlocal title, section
+
+        if isinstance(node, NavigableString):
+            text = re.sub(r"\s+", " ", str(node)).strip()
+            if text:
+                prose.append(text)
+            return
+        if not isinstance(node, Tag):
+            return
+
+        if node.name in HEADINGS:
+            flush_prose()
+            text = block_text(node)
+            if not title:
+                title = text
+            else:
+                section = text
+            return
+
+        if node.name == "table":
+            flush_prose()
+            rows = node.find_all("tr")
+            headers = []
+            if rows and rows[0].find("th"):
+                headers = [block_text(cell) for cell in rows[0].find_all(["th", "td"], recursive=False)]
+                rows = rows[1:]
+            for row in rows:
+                chunks.extend(_row_chunks(row, headers, context(), group_hmo_columns))
+            return
+
+        if node.name in ("ul", "ol"):
+            items = [block_text(li) for li in node.find_all("li", recursive=False)]
+            items = [item for item in items if item]
+            hmos = [tag_chunk(item)["hmo"] for item in items]
+            if items and all(hmos):
+                for hmo, item in zip(hmos, items):
+                    per_hmo.setdefault(hmo, []).append(f"{section}\n{item}" if section else item)
+            elif items:
+                prose.append("\n".join(f"- {item}" for item in items))
+            return
+
+        if node.name == "p":
+            text = block_text(node)
+            if text:
+                prose.append(text)
+            return
+
+        for child in node.children:
+            visit(child)
+
+    for child in root.children:
+        visit(child)
+    flush_prose()
+
+    for items in per_hmo.values():
+        chunks.append("\n".join([title, *items]) if title else "\n".join(items))
+
+    return chunks
+
+
+def chunk_file(html_file: Path) -> List[Dict]:
+    """
+    Loads one HTML file and splits it into text chunks (no embeddings).
+    Each chunk is tagged with the HMO and tier it is about (None = general).
     
     Structure:
     [
         {
             "text": "...",
-            "embedding": [0.1, 0.2, ...],
-            "source": "dental_services"
+            "source": "dental_services",
+            "hmo": "maccabi",
+            "tier": None
         },
         ...
     ]
     """
-    vector_store = []
-    
-    print("Loading knowledge base and generating embeddings... (This may take a moment)")
+    service_name = html_file.stem
 
-    for html_file in base_path.glob("*.html"):
-        service_name = html_file.stem
+    with open(html_file, encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
 
-        with open(html_file, encoding="utf-8") as f:
-            soup = BeautifulSoup(f.read(), "html.parser")
+    for tag in soup(["script", "style"]):
+        tag.decompose()
 
-        for tag in soup(["script", "style"]):
-            tag.decompose()
+    texts = chunk_html(soup)
 
-        clean_text = soup.get_text(separator="\n")
-        
-        # Create chunks
-        chunks = chunk_text(clean_text)
-        
-        for chunk in chunks:
-            if not chunk.strip():
-                continue
-                
-            # Generate embedding for this chunk
-            vector = get_embedding(chunk)
-            
-            vector_store.append({
-                "text": chunk,
-                "embedding": vector,
-                "source": service_name
-            })
-            
-    print(f"Knowledge base loaded. Total chunks: {len(vector_store)}")
-    return vector_store
\ No newline at end of file
+    # Pages without recognizable structure fall back to plain paragraph splitting
+    if not texts:
+        texts = chunk_text(soup.get_text(separator="\n"))
+
+    chunks = []
+    for chunk in texts:
+        if not chunk.strip():
+            continue
+
+        chunks.append({
+            "text": chunk,
+            "source": service_name,
+            **tag_chunk(chunk)
+        })
+
+    return chunks
+
+
+def load_chunks(base_path: Path) -> List[Dict]:
+    """
+    Chunks every HTML file in the knowledge directory (see chunk_file).
+    """
+    chunks = []
+    for html_file in sorted(base_path.glob("*.html")):
+        chunks.extend(chunk_file(html_file))
+    return chunks
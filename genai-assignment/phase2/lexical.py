@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Hebrew points and cantillation marks (niqqud), dropped before matching
+NIQQUD_RE = re.compile(r"[\u0591-\u05C7]")
+# Final letters are matched as their regular form (ך -> כ, ם -> מ, ...)
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+WORD_RE = re.compile(r"[0-9a-z\u05D0-\u05EA]+")
+# One-letter prefixes: ו (and), ה (the), ב (in), ל (to), מ (from), ש (that), כ (as)
+HEBREW_PREFIXES = "והבלמשכ"
+
+# Saved BM25 index: bm25-terms.json (vocabulary and parameters) plus one .npy per array
+BM25_TERMS_FILE = "bm25-terms.json"
+BM25_ARRAYS = ("offsets", "doc_ids", "tfs", "idf", "length_norm")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = NIQQUD_RE.sub("", text)
+    return text.casefold().translate(FINAL_LETTERS)
+
+
+def words(text: str) -> List[str]:
+    """
+    Splits text into normalized Hebrew/English words.
+    """
+    return WORD_RE.findall(normalize_text(text))
+
+
+def expand_word(word: str) -> List[str]:
+    """
+    Returns the word plus its forms without one or two leading Hebrew prefixes
+    ("ובמכבי" -> "ובמכבי", "במכבי", "מכבי").
+    We cannot tell a prefix from the first letter of the stem, so both forms are kept;
+    the same expansion is applied to documents and queries.
+    """
+    variants = [word]
+    if "א" <= word[0] <= "ת":
+        if len(word) >= 4 and word[0] in HEBREW_PREFIXES:
+            variants.append(word[1:])
+            if len(word) >= 5 and word[1] in HEBREW_PREFIXES:
+                variants.append(word[2:])
+    return variants
+
+
+def tokenize(text: str) -> List[str]:
+    return [variant for word in words(text) for variant in expand_word(word)]
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+    Postings are stored CSR-style in flat arrays: the term with position t in
+    'terms' has documents doc_ids[offsets[t]:offsets[t + 1]] with frequencies
+    tfs[offsets[t]:offsets[t + 1]]. Only the term -> position dict is a Python
+    structure, so an index saved with the knowledge index can be memory-mapped
+    and shared read-only by every worker on the node.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, idf: np.ndarray, length_norm: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75):
+        self.terms = terms
+        self.positions = {term: t for t, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.idf = idf
+        # Length normalization part of the BM25 denominator, per document
+        self.length_norm = length_norm
+        self.k1 = k1
+        self.b = b
+        self.size = len(length_norm)
+        self.max_idf = float(idf.max()) if len(idf) else 0.0
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        postings: Dict[str, list] = defaultdict(list)
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        avg_length = float(doc_lengths.mean()) if len(texts) else 0.0
+        length_norm = (k1 * (1 - b + b * doc_lengths / (avg_length or 1.0))).astype(np.float32)
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        doc_ids = np.array([doc_id for term in terms for doc_id, _ in postings[term]], dtype=np.int64)
+        tfs = np.array([tf for term in terms for _, tf in postings[term]], dtype=np.float32)
+        df = np.diff(offsets).astype(np.float64)
+        idf = np.log(1 + (len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        return cls(terms, offsets, doc_ids, tfs, idf, length_norm, k1=k1, b=b)
+
+    def save(self, directory: Path) -> None:
+        # The terms file is written last and atomically, load() only trusts complete indexes
+        directory = Path(directory)
+        for name in BM25_ARRAYS:
+            np.save(directory / f"bm25-{name}.npy", getattr(self, name))
+        tmp_path = directory / f".{BM25_TERMS_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": self.terms}, f, ensure_ascii=False)
+        os.replace(tmp_path, directory / BM25_TERMS_FILE)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> Optional["BM25Index"]:
+        """
+        Loads a saved index with its arrays memory-mapped read-only.
+        Returns None if the directory has no BM25 index (built by an older version).
+        """
+        directory = Path(directory)
+        if not (directory / BM25_TERMS_FILE).exists():
+            return None
+
+        with open(directory / BM25_TERMS_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(directory / f"bm25-{name}.npy", mmap_mode="r" if mmap else None)
+            for name in BM25_ARRAYS
+        }
+        return cls(meta["terms"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (document ids, term frequencies) of a term, or None if no document has it.
+        """
+        t = self.positions.get(term)
+        if t is None:
+            return None
+        start, end = self.offsets[t], self.offsets[t + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every document for the query.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in tokenize(query):
+            t = self.positions.get(term)
+            if t is None:
+                continue
+            ids, tfs = self.postings(term)
+            scores[ids] += self.idf[t] * tfs * (self.k1 + 1) / (tfs + self.length_norm[ids])
+        return scores
+
+    def coverage(self, query: str, doc_id: int) -> float:
+        """
+        Share of the query's IDF weight found in one document (0.0 - 1.0).
+        Each query word counts once, matched through any of its prefix variants.
+        Words the corpus has never seen get the maximum weight, so a query that
+        is mostly unknown to the index never looks lexically confident.
+        """
+        total, matched = 0.0, 0.0
+        for word in words(query):
+            variants = [v for v in expand_word(word) if v in self.positions]
+            weight = max((float(self.idf[self.positions[v]]) for v in variants), default=self.max_idf)
+            total += weight
+            if any(doc_id in self.postings(v)[0] for v in variants):
+                matched += weight
+        return matched / total if total else 0.0
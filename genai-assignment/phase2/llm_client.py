@@ -1,6 +1,14 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Optional
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+from phase2.metrics import stage, record_usage, LLM_TOKENS
+from phase2.scheduler import chat_scheduler, embedding_scheduler, BATCH
+from phase2.single_flight import chat_flights, embedding_flights, payload_key
+from phase2.tokens import count_tokens
 
 
 # Load environment variables from .env file.
@@ -13,12 +21,49 @@ if not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_KEY:
     raise RuntimeError("Missing Azure OpenAI credentials in environment variables")
 
 
+AZURE_OPENAI_API_VERSION = "2024-02-15-preview"
+
+# Retries are done by the schedulers (phase2/scheduler.py), which know about the
+# rate limits shared by all calls, so the SDK's own retries are disabled.
+
+# Blocking client for scripts and index builds
 client = AzureOpenAI(
     api_key=AZURE_OPENAI_KEY,
     azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version="2024-02-15-preview"
+    api_version=AZURE_OPENAI_API_VERSION,
+    max_retries=0
+)
+
+# Async client for the API, so waiting on the LLM does not hold a thread
+async_client = AsyncAzureOpenAI(
+    api_key=AZURE_OPENAI_KEY,
+    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    api_version=AZURE_OPENAI_API_VERSION,
+    max_retries=0
 )
 
+CHAT_MODEL = "gpt-4o"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Batch embedding limits (per request) and how many requests may run in parallel
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "128"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "64000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Reply size assumed when reserving tokens-per-minute capacity for a chat call
+COMPLETION_TOKENS_ESTIMATE = int(os.getenv("COMPLETION_TOKENS_ESTIMATE", "500"))
+
+
+def chat_tokens(messages: list[dict]) -> int:
+    """
+    Tokens-per-minute estimate of a chat call: the prompt plus the expected reply.
+    """
+    return sum(count_tokens(message["content"]) for message in messages) + COMPLETION_TOKENS_ESTIMATE
+
+
+def embedding_tokens(texts: list[str]) -> int:
+    return sum(count_tokens(text) for text in texts)
+
 
 def call_llm(messages: list[dict], temperature: float = 0.0) -> str:
     """
@@ -30,15 +75,28 @@ def call_llm(messages: list[dict], temperature: float = 0.0) -> str:
         {"role": "user", "content": "..."},
         {"role": "assistant", "content": "..."}
     ]
+    Identical temperature 0 calls made at the same time share one request.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=temperature
-    )
+    def request() -> str:
+        with stage("llm"):
+            response = chat_scheduler.call(
+                lambda timeout: client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout
+                ),
+                tokens=chat_tokens(messages)
+            )
+        record_usage(CHAT_MODEL, response)
 
-    return response.choices[0].message.content
+        return response.choices[0].message.content
+
+    # Only deterministic calls are coalesced, sampled replies are meant to differ
+    if temperature == 0:
+        return chat_flights.do(payload_key(CHAT_MODEL, messages), request)
+    return request()
 
 
 def get_embedding(text: str) -> list[float]:
@@ -49,9 +107,179 @@ def get_embedding(text: str) -> list[float]:
     # Ensure text is not empty or too long
     text = text.replace("\n", " ")
     
-    response = client.embeddings.create(
-        input=[text],
-        model="text-embedding-ada-002"
-    )
-    
-    return response.data[0].embedding
\ No newline at end of file
+    def request() -> list[float]:
+        with stage("embedding"):
+            response = embedding_scheduler.call(
+                lambda timeout: client.embeddings.create(
+                    input=[text],
+                    model=EMBEDDING_MODEL,
+                    timeout=timeout
+                ),
+                tokens=embedding_tokens([text])
+            )
+        record_usage(EMBEDDING_MODEL, response)
+        
+        return response.data[0].embedding
+
+    # Concurrent requests for the same text share one call
+    return embedding_flights.do(payload_key(EMBEDDING_MODEL, text), request)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap upper bound on the number of tokens in a text.
+    BPE tokenizers never produce more tokens than UTF-8 bytes.
+    """
+    return len(text.encode("utf-8"))
+
+
+def _embedding_batches(texts: list[str]) -> list[list[int]]:
+    """
+    Groups text indices into batches that respect the per-request input and token limits.
+    A single text larger than the token limit is sent on its own.
+    """
+    batches = []
+    current, current_tokens = [], 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (
+            len(current) >= EMBEDDING_BATCH_MAX_INPUTS
+            or current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def get_embeddings(texts: list[str], max_workers: int = EMBEDDING_CONCURRENCY,
+                   on_progress: Optional[Callable[[int, int], None]] = None) -> list[list[float]]:
+    """
+    Generates embeddings for many texts at once.
+    Texts are packed into batched requests, and up to 'max_workers' requests run concurrently.
+    Vectors are returned in the same order as 'texts'.
+    'on_progress(done, total)' is called after every finished batch.
+    """
+    texts = [text.replace("\n", " ") for text in texts]
+    vectors: list = [None] * len(texts)
+
+    batches = _embedding_batches(texts)
+    if not batches:
+        return []
+
+    done = 0
+    progress_lock = threading.Lock()
+
+    def embed_batch(indices: list[int]) -> None:
+        nonlocal done
+        batch = [texts[i] for i in indices]
+        # Index builds are batch work, queries from users go first
+        response = embedding_scheduler.call(
+            lambda timeout: client.embeddings.create(
+                input=batch,
+                model=EMBEDDING_MODEL,
+                timeout=timeout
+            ),
+            tokens=embedding_tokens(batch),
+            priority=BATCH
+        )
+        record_usage(EMBEDDING_MODEL, response)
+        # The API reports the position of each input in the batch
+        for item in response.data:
+            vectors[indices[item.index]] = item.embedding
+
+        if on_progress is not None:
+            with progress_lock:
+                done += len(indices)
+                on_progress(done, len(texts))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+        # list() re-raises the first failed batch
+        list(pool.map(embed_batch, batches))
+
+    return vectors
+
+
+# Async variants used by the API. Same behavior as the sync functions above.
+
+async def acall_llm(messages: list[dict], temperature: float = 0.0) -> str:
+    """
+    Async version of call_llm.
+    """
+    async def request() -> str:
+        with stage("llm"):
+            response = await chat_scheduler.acall(
+                lambda timeout: async_client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout
+                ),
+                tokens=chat_tokens(messages)
+            )
+        record_usage(CHAT_MODEL, response)
+
+        return response.choices[0].message.content
+
+    if temperature == 0:
+        return await chat_flights.ado(payload_key(CHAT_MODEL, messages), request)
+    return await request()
+
+
+async def astream_llm(messages: list[dict], temperature: float = 0.0) -> AsyncIterator[str]:
+    """
+    Streams the chat completion, yielding the reply text as it is generated.
+    """
+    parts = []
+    with stage("llm"):
+        # Only opening the stream is retried, never a reply that already started
+        stream = await chat_scheduler.acall(
+            lambda timeout: async_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                timeout=timeout
+            ),
+            tokens=chat_tokens(messages)
+        )
+
+        async for chunk in stream:
+            # Azure sends a first chunk without choices (content filter results)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+
+    # Streamed responses carry no usage with this API version, count the tokens locally
+    LLM_TOKENS.inc(sum(count_tokens(message["content"]) for message in messages), model=CHAT_MODEL, kind="prompt")
+    LLM_TOKENS.inc(count_tokens("".join(parts)), model=CHAT_MODEL, kind="completion")
+
+
+async def aget_embedding(text: str) -> list[float]:
+    """
+    Async version of get_embedding.
+    """
+    text = text.replace("\n", " ")
+
+    async def request() -> list[float]:
+        with stage("embedding"):
+            response = await embedding_scheduler.acall(
+                lambda timeout: async_client.embeddings.create(
+                    input=[text],
+                    model=EMBEDDING_MODEL,
+                    timeout=timeout
+                ),
+                tokens=embedding_tokens([text])
+            )
+        record_usage(EMBEDDING_MODEL, response)
+
+        return response.data[0].embedding
+
+    return await embedding_flights.ado(payload_key(EMBEDDING_MODEL, text), request)
@@ -0,0 +1,116 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+# Upper bound of one incremental read, so a client far behind cannot request the whole file
+MAX_READ_BYTES = 256 * 1024
+
+
+def make_cursor(inode: int, offset: int) -> str:
+    """
+    Cursor "<inode>:<offset>": the file it points into and the position in it,
+    so a rotation is noticed even when the new file is already longer.
+    """
+    return f"{inode}:{offset}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    (inode, offset) of a cursor; raises ValueError for a malformed one.
+    """
+    inode, offset = cursor.split(":")
+    return int(inode), int(offset)
+
+
+def _rotated_file(path: Path, inode: int) -> Optional[Path]:
+    """
+    The rotated copy of 'path' with the given inode (chatbot.log.1, chatbot.log.2024-01-01, ...).
+    """
+    path = Path(path)
+    for candidate in path.parent.glob(f"{path.name}.*"):
+        try:
+            if candidate.stat().st_ino == inode:
+                return candidate
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _decode(data: bytes) -> List[str]:
+    return data.decode("utf-8", errors="replace").splitlines(keepends=True)
+
+
+def tail(path: Path, n: int = 50, block_size: int = 8192) -> Tuple[List[str], str]:
+    """
+    Last 'n' lines of a file and the offset after them (the cursor for read_since).
+    Reads blocks backwards from the end, so the cost does not depend on the file size.
+    """
+    with open(path, "rb") as f:
+        inode = os.fstat(f.fileno()).st_ino
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+
+        # n complete lines are found once there are n + 1 newlines
+        while position > 0 and data.count(b"\n") <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+
+    # A partially written last line is left for read_since
+    partial = len(data) - (data.rfind(b"\n") + 1)
+    lines = _decode(data[:len(data) - partial])
+    return lines[-n:] if n > 0 else [], make_cursor(inode, end - partial)
+
+
+def read_since(path: Path, cursor: str, max_bytes: int = MAX_READ_BYTES) -> Tuple[List[str], str]:
+    """
+    Complete lines written after 'cursor', and the new cursor.
+
+    If the log was rotated since, the rest of the rotated file (found by its
+    inode) is returned first, then reading continues at the start of the new
+    file. If the file was truncated, or the rotated file is gone, reading
+    restarts at 0. A partially written last line is left for the next call.
+    """
+    inode, offset = parse_cursor(cursor)
+    current_inode = os.stat(path).st_ino
+
+    if inode != current_inode:
+        rotated = _rotated_file(path, inode)
+        if rotated is not None:
+            lines, new_offset = _read_lines(rotated, offset, max_bytes, final=True)
+            if lines:
+                return lines, make_cursor(inode, new_offset)
+        inode, offset = current_inode, 0
+
+    lines, offset = _read_lines(path, offset, max_bytes)
+    return lines, make_cursor(inode, offset)
+
+
+def _read_lines(path: Path, offset: int, max_bytes: int, final: bool = False) -> Tuple[List[str], int]:
+    """
+    Complete lines after 'offset' and the offset after them. 'final' files
+    (rotated away, no longer written) also return their unterminated last line.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        if offset > end:
+            offset = 0
+        if offset == end:
+            return [], offset
+
+        f.seek(offset)
+        data = f.read(min(end - offset, max_bytes))
+
+    complete = data.rfind(b"\n") + 1
+    if final and offset + len(data) == end:
+        complete = len(data)
+    if complete == 0 and len(data) < max_bytes:
+        return [], offset
+    if complete == 0:
+        # A single line longer than max_bytes, return it in pieces
+        complete = len(data)
+
+    return _decode(data[:complete]), offset + complete
@@ -1,45 +1,189 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
 import sys
+import time
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler, WatchedFileHandler
+)
 from pathlib import Path
 
+from phase2.file_lock import file_lock
+
+
+LOG_DIR = Path(__file__).parent / ".." / "logs"
+LOG_FILE_PATH = LOG_DIR / "chatbot.log"
+
+# "text" (human readable) or "json" (one JSON object per line, for latency analysis)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Rotation: "size" (LOG_MAX_MB per file), "time" (every LOG_ROTATE_WHEN, e.g. "midnight"),
+# or "external" (logrotate or similar renames the file, the app only reopens it)
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", "10"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+# Per-request fields added to every record logged while handling the request
+request_id_var = contextvars.ContextVar("request_id", default=None)
+phase_var = contextvars.ContextVar("phase", default=None)
+
+
+class SharedRolloverMixin:
+    """
+    Makes a rotating file handler safe when several processes (API workers)
+    write the same file. Before each record the handler reopens the path if
+    another process rotated it, and a rollover happens under a lock file and
+    only if no other process did it first.
+    """
+
+    def _follow_rotation(self) -> bool:
+        # Returns True if the path now names another file than the open stream
+        if self.stream is None:
+            return False
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            on_disk = None
+        opened = os.fstat(self.stream.fileno())
+        if on_disk is not None and (on_disk.st_dev, on_disk.st_ino) == (opened.st_dev, opened.st_ino):
+            return False
+
+        self.stream.close()
+        self.stream = self._open()
+        if hasattr(self, "rolloverAt"):
+            # The other process's rollover counts for this interval too
+            self.rolloverAt = self.computeRollover(int(time.time()))
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._follow_rotation()
+        super().emit(record)
+
+    def doRollover(self) -> None:
+        with file_lock(f"{self.baseFilename}.lock"):
+            if self._follow_rotation():
+                # Rotated by another process meanwhile
+                return
+            super().doRollover()
+
+
+class SharedRotatingFileHandler(SharedRolloverMixin, RotatingFileHandler):
+    pass
+
+
+class SharedTimedRotatingFileHandler(SharedRolloverMixin, TimedRotatingFileHandler):
+    pass
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the request context onto the record. Runs before the queue, in the
+    thread that logs, where the context variables are set.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.phase = phase_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, message, request_id, phase,
+    and 'timings' (seconds per stage) when passed with extra={"timings": {...}}.
+    Tracebacks are part of the message (the queue handler formats them in).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "phase": getattr(record, "phase", None),
+        }
+        timings = getattr(record, "timings", None)
+        if timings:
+            entry["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The original text format, with the request ID when there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"[{request_id}] {text}" if request_id else text
+
+
 def setup_logger():
     """
     Configures a centralized logger for the application.
-    Writes logs to both the console (stdout) and a file (logs/chatbot.log).
+    Writes logs to both the console (stdout) and a rotating file (logs/chatbot.log).
+
+    Request handlers only put records on a queue; a background listener thread
+    formats them and does the file and console I/O.
     """
-    
+
     #Create a logger
     logger = logging.getLogger("medical_chatbot")
     logger.setLevel(logging.INFO)
 
-    #Prevent adding handlers multiple times 
+    #Prevent adding handlers multiple times
     if logger.hasHandlers():
         return logger
 
     #Create 'logs' directory if it doesn't exist
-    log_dir = Path(__file__).parent / ".." / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_file_path = log_dir / "chatbot.log"
-
-    #Define format 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
-    #File Handler (Writes to disk, supports Hebrew via utf-8)
-    file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    #Define format
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+    else:
+        formatter = TextFormatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
+    #File Handler (Writes to disk, supports Hebrew via utf-8), rotated by size or time.
+    #Several processes share the file, so rotation is coordinated between them.
+    if LOG_ROTATION == "external":
+        file_handler = WatchedFileHandler(LOG_FILE_PATH, encoding='utf-8')
+    elif LOG_ROTATION == "time":
+        file_handler = SharedTimedRotatingFileHandler(
+            LOG_FILE_PATH, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        file_handler = SharedRotatingFileHandler(
+            LOG_FILE_PATH, maxBytes=int(LOG_MAX_MB * 1024 * 1024),
+            backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
     file_handler.setFormatter(formatter)
 
     #Stream Handler (Writes to console)
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(formatter)
 
-    #Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    #Queue Handler: the only handler on the logger, so logging never blocks on I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Flush the queue on shutdown
+    atexit.register(listener.stop)
 
     return logger
 
 # Create the singleton instance
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
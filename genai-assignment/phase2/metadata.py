@@ -0,0 +1,112 @@
+from typing import Dict, Optional, Set
+
+from phase2.lexical import normalize_text, words, expand_word
+
+
+# Canonical HMO / tier keys and the names users and documents use for them
+HMO_ALIASES = {
+    "maccabi": ["מכבי", "maccabi", "macabi"],
+    "meuhedet": ["מאוחדת", "meuhedet", "meuchedet", "meuhedeth"],
+    "clalit": ["כללית", "clalit", "klalit"],
+}
+
+TIER_ALIASES = {
+    "gold": ["זהב", "gold"],
+    "silver": ["כסף", "silver"],
+    "bronze": ["ארד", "bronze"],
+}
+
+
+def _alias_lookup(aliases: Dict[str, list]) -> Dict[str, str]:
+    return {normalize_text(alias): key for key, names in aliases.items() for alias in names}
+
+
+_HMO_LOOKUP = _alias_lookup(HMO_ALIASES)
+_TIER_LOOKUP = _alias_lookup(TIER_ALIASES)
+
+
+def _mentions(text: str, lookup: Dict[str, str]) -> Set[str]:
+    """
+    Canonical keys mentioned anywhere in the text (prefixed forms like "במכבי" included).
+    """
+    found = set()
+    for word in words(text):
+        for variant in expand_word(word):
+            if variant in lookup:
+                found.add(lookup[variant])
+    return found
+
+
+def _single(found: Set[str]) -> Optional[str]:
+    return next(iter(found)) if len(found) == 1 else None
+
+
+def canonical_hmo(value: Optional[str]) -> Optional[str]:
+    """
+    Maps a user-facing HMO name ("מכבי", "Maccabi") to its key, or None if unknown.
+    """
+    return _single(_mentions(value or "", _HMO_LOOKUP))
+
+
+def canonical_tier(value: Optional[str]) -> Optional[str]:
+    """
+    Maps a user-facing tier name ("זהב", "Gold") to its key, or None if unknown.
+    """
+    return _single(_mentions(value or "", _TIER_LOOKUP))
+
+
+def _labelled_tiers(text: str) -> Set[str]:
+    """
+    Tiers that label a line of the text ("זהב: 70% הנחה").
+    Tier names are common words ("כסף" is also money), so mentions elsewhere do not count.
+    """
+    found = set()
+    for line in text.split("\n"):
+        if ":" in line:
+            found |= _mentions(line.split(":", 1)[0], _TIER_LOOKUP)
+    return found
+
+
+def drop_other_profiles(text: str, hmo: Optional[str] = None, tier: Optional[str] = None) -> str:
+    """
+    Removes the lines of a chunk that are about another HMO or tier than the user's.
+
+    Lines labelled with a tier ("כסף: 50% הנחה") are kept only for the user's tier.
+    A line labelled with an HMO is kept only for the user's HMO; if it is a bare
+    heading ("מכבי:"), so are the lines under it, up to the next heading.
+    An unknown HMO or tier keeps everything on that dimension.
+    """
+    hmo, tier = canonical_hmo(hmo), canonical_tier(tier)
+    if hmo is None and tier is None:
+        return text
+
+    kept = []
+    block_hmo = None
+    for line in text.split("\n"):
+        label, _, rest = line.partition(":") if ":" in line else ("", "", line)
+        line_hmo = _single(_mentions(label, _HMO_LOOKUP))
+        line_tier = _single(_mentions(label, _TIER_LOOKUP))
+
+        if label and not rest.strip() and line_tier is None:
+            block_hmo = line_hmo
+
+        if hmo is not None and (line_hmo or block_hmo) not in (None, hmo):
+            continue
+        if tier is not None and line_tier not in (None, tier):
+            continue
+        kept.append(line)
+
+    return "\n".join(kept)
+
+
+def tag_chunk(text: str) -> Dict[str, Optional[str]]:
+    """
+    HMO and tier metadata for a chunk.
+    A chunk that mentions exactly one HMO (or has lines for exactly one tier) is
+    tagged with it; chunks with none or several are general (None) and are
+    relevant to every user.
+    """
+    return {
+        "hmo": _single(_mentions(text, _HMO_LOOKUP)),
+        "tier": _single(_labelled_tiers(text)),
+    }
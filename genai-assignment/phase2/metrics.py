@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+
+# Latency buckets in seconds, from cache hits (ms) to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter, one series per combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """
+    Cumulative histogram (Prometheus semantics), one series per label combination.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    bucket_label = f'le="{le}"'
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, bucket_label)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from a callback returning {label value: number}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label: str, read: Callable[[], Dict[str, float]]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = (label,)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_label_text(self.labels, (key,))} {_number(value)}"
+            for key, value in sorted(self.read().items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_request_seconds", "Total /chat request time.", ("endpoint", "phase")
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_stage_seconds", "Time spent per stage (embedding, bm25, vector_search, llm, extraction).", ("stage",)
+))
+FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_first_token_seconds", "Time to the first streamed token of /chat/stream.", ("phase",)
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "chatbot_llm_tokens_total", "Tokens from the OpenAI usage fields (counted locally for streamed replies).", ("model", "kind")
+))
+EXTRACTIONS = REGISTRY.register(Counter(
+    "chatbot_extractions_total", "User info extractions by path (local rules or LLM).", ("path",)
+))
+RETRIES = REGISTRY.register(Counter(
+    "chatbot_llm_retries_total", "Retried Azure OpenAI calls per scheduler and error type.", ("scheduler", "error")
+))
+COALESCED = REGISTRY.register(Counter(
+    "chatbot_coalesced_calls_total", "Calls served by an identical request already in flight.", ("kind",)
+))
+CONTEXT_TOKENS = REGISTRY.register(Histogram(
+    "chatbot_context_tokens", "Tokens of retrieved knowledge put in a QA prompt.", (),
+    buckets=(50, 100, 200, 400, 800, 1600, 3200)
+))
+ERRORS = REGISTRY.register(Counter(
+    "chatbot_errors_total", "Errors per stage.", ("stage",)
+))
+
+
+def record_usage(model: str, response) -> None:
+    """
+    Adds the token counts from the 'usage' field of an OpenAI response.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a block into chatbot_stage_seconds and counts its exceptions in chatbot_errors_total.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, stage=name)
@@ -116,7 +116,8 @@ def qa_prompt(language: str, knowledge_text: str) -> str:
             "אתה עוזר מידע רפואי של קופת חולים.\n\n"
             "ענה אך ורק על סמך מאגר הידע הבא.\n"
             "אם אין מידע רלוונטי — ציין זאת במפורש.\n"
-            "אל תנחש ואל תוסיף ידע חיצוני.\n\n"
+            "אל תנחש ואל תוסיף ידע חיצוני.\n"
+            "אל תפנה למשתמש בשמו ואל תזכיר את פרטיו האישיים, התשובה משמשת גם משתמשים אחרים באותה קופה ורמת ביטוח.\n\n"
             f"מאגר ידע:\n{knowledge_text}"
         )
 
@@ -124,7 +125,9 @@ def qa_prompt(language: str, knowledge_text: str) -> str:
         "You are a medical services assistant for a health fund.\n\n"
         "Answer strictly based on the knowledge base below.\n"
         "If the information is not available, state that clearly.\n"
-        "Do not guess and do not add external knowledge.\n\n"
+        "Do not guess and do not add external knowledge.\n"
+        "Do not address the user by name or mention their personal details; "
+        "the answer is also given to other members with the same HMO and tier.\n\n"
         f"Knowledge base:\n{knowledge_text}"
     )
 def user_info_extraction_prompt(language: str) -> str:
@@ -0,0 +1,135 @@
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from phase2.ann import top_k_ids
+from phase2.lexical import BM25Index, words
+from phase2.vector_store import VectorStore, normalize_vector
+from phase2.metrics import stage
+from phase2.logger import logger
+
+
+# Weight of the vector score in the hybrid score (1 - HYBRID_ALPHA goes to BM25)
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.7"))
+
+# Lexical fast path: short queries whose words are (almost) all found in the best
+# BM25 chunk are answered without embedding. Set LEXICAL_SKIP_COVERAGE above 1 to disable.
+LEXICAL_SKIP_COVERAGE = float(os.getenv("LEXICAL_SKIP_COVERAGE", "0.9"))
+LEXICAL_SKIP_MAX_WORDS = int(os.getenv("LEXICAL_SKIP_MAX_WORDS", "6"))
+
+# How many candidates each side contributes to the fusion, relative to top_k
+CANDIDATE_MULTIPLIER = 4
+
+
+def min_max(scores: np.ndarray) -> np.ndarray:
+    low, high = scores.min(), scores.max()
+    if high - low < 1e-9:
+        return np.ones_like(scores) if high > 0 else np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+class Retriever:
+    """
+    Hybrid retrieval over one knowledge snapshot: BM25 over the chunk texts
+    fused with vector similarity from the VectorStore.
+    Searches are restricted to the partitions matching the user's HMO and tier.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+        self.lexical = store.lexical
+        if self.lexical is None:
+            self.lexical = BM25Index.build([chunk["text"] for chunk in store.chunks])
+
+    def search(self, query: str, embed: Callable[[str], np.ndarray], top_k: int = 3,
+               hmo: Optional[str] = None, tier: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """
+        Returns the top_k (score, chunk) pairs for a query, best first.
+        'embed' is only called when the lexical match alone is not confident enough.
+        """
+        lexical = self.lexical_stage(query, top_k, hmo, tier)
+        if lexical[2] is not None:
+            return lexical[2]
+        return self.vector_stage(embed(query), lexical, top_k)
+
+    def lexical_stage(self, query: str, top_k: int = 3, hmo: Optional[str] = None,
+                      tier: Optional[str] = None) -> tuple:
+        """
+        First half of a search, for callers that need to know whether the query
+        will be embedded at all. Returns (keys, lexical_scores, results):
+        'results' is set when the search is already answered, otherwise pass
+        the tuple and the query embedding to vector_stage().
+        """
+        with stage("bm25"):
+            return self._lexical_stage(query, top_k, hmo, tier)
+
+    def vector_stage(self, query_vector, lexical: tuple, top_k: int = 3) -> List[Tuple[float, Dict]]:
+        """
+        Second half of a search: fuses vector similarity with the lexical scores.
+        """
+        keys, lexical_scores, _ = lexical
+        query_vector = normalize_vector(query_vector)
+        if query_vector is None:
+            return []
+
+        with stage("vector_search"):
+            return self._fuse(query_vector, lexical_scores, top_k, keys)
+
+    def _lexical_stage(self, query: str, top_k: int, hmo: Optional[str], tier: Optional[str]):
+        """
+        Scores the query with BM25 inside the user's partitions.
+        Returns (keys, lexical_scores, results); 'results' is set when the search
+        is already answered (nothing to search, or the lexical fast path).
+        """
+        keys = self.store.partition_keys(hmo, tier)
+        if len(self.store) == 0 or top_k <= 0 or not keys:
+            return keys, None, []
+
+        # BM25 is scored over all postings, then rows outside the user's partitions are zeroed
+        lexical_scores = self.lexical.scores(query)
+        if len(keys) < len(self.store.partitions):
+            allowed = np.zeros(len(self.store), dtype=bool)
+            allowed[self.store.row_ids(keys)] = True
+            lexical_scores[~allowed] = 0.0
+
+        if self._lexically_confident(query, lexical_scores):
+            ids = top_k_ids(lexical_scores, top_k)
+            ids = ids[lexical_scores[ids] > 0]
+            logger.info("Knowledge Search: lexical fast path, embedding skipped.")
+            return keys, lexical_scores, [(float(lexical_scores[i]), self.store.chunks[i]) for i in ids]
+
+        return keys, lexical_scores, None
+
+    def _lexically_confident(self, query: str, lexical_scores: np.ndarray) -> bool:
+        best = int(np.argmax(lexical_scores))
+        if lexical_scores[best] <= 0:
+            return False
+        if len(words(query)) > LEXICAL_SKIP_MAX_WORDS:
+            return False
+        return self.lexical.coverage(query, best) >= LEXICAL_SKIP_COVERAGE
+
+    def _fuse(self, query_vector: np.ndarray, lexical_scores: np.ndarray,
+              top_k: int, keys: List[Tuple[str, str]]) -> List[Tuple[float, Dict]]:
+        """
+        Combines min-max normalized vector and BM25 scores over the union of
+        both candidate lists.
+        """
+        pool = top_k * CANDIDATE_MULTIPLIER
+        vector_ids, _ = self.store.search_ids(query_vector, pool, keys)
+        lexical_ids = top_k_ids(lexical_scores, pool)
+        lexical_ids = lexical_ids[lexical_scores[lexical_ids] > 0]
+
+        candidates = np.union1d(vector_ids, lexical_ids)
+        vector_scores = self.store.similarities(query_vector, candidates)
+
+        if len(lexical_ids) == 0:
+            fused = vector_scores
+        else:
+            fused = (
+                HYBRID_ALPHA * min_max(vector_scores)
+                + (1 - HYBRID_ALPHA) * min_max(lexical_scores[candidates])
+            )
+
+        best = top_k_ids(fused, top_k)
+        return [(float(fused[i]), self.store.chunks[candidates[i]]) for i in best]
@@ -0,0 +1,283 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import openai
+
+from phase2.metrics import RETRIES
+from phase2.logger import logger
+
+
+# Priorities: interactive chat requests go before batch work (index builds)
+INTERACTIVE = 0
+BATCH = 1
+
+# Errors worth retrying: rate limits, timeouts, connection problems and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Longest single sleep while waiting for capacity, so deadlines and new
+# higher-priority requests are noticed quickly
+MAX_POLL_SECONDS = 0.25
+
+
+class TokenBucket:
+    """
+    Holds up to 'per_minute' units and refills continuously at per_minute / 60 per second.
+    The level may go negative when a request uses more than was reserved for it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        Seconds until 'amount' is available while leaving 'reserve' in the bucket.
+        A request larger than the bucket waits for a full bucket.
+        """
+        needed = min(amount + reserve, self.capacity)
+        return max(0.0, (needed - self.level) / self.rate)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the server in the Retry-After (or retry-after-ms) header, in seconds.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class LLMScheduler:
+    """
+    Admission control for one Azure OpenAI deployment.
+
+    Every call first waits for capacity in two token buckets, requests per minute
+    and tokens per minute (using the caller's token estimate, corrected with the
+    reported usage afterwards). Waiting calls are served by priority, then in
+    arrival order, and batch calls leave 'batch_reserve' of each bucket to
+    interactive ones.
+
+    Failed calls are retried with jittered exponential backoff. A Retry-After
+    from the server pauses the whole deployment for that long, not only the
+    failed call. No call waits or retries past its deadline.
+
+    Works from threads (call) and from asyncio (acall); both share the same buckets.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float, max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0, batch_reserve: float = 0.2,
+                 interactive_deadline: float = 60.0, batch_deadline: float = 600.0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_reserve = batch_reserve
+        self.deadlines = {INTERACTIVE: interactive_deadline, BATCH: batch_deadline}
+
+        self._lock = threading.Lock()
+        self._waiting = []  # heap of (priority, arrival) tickets
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0
+
+    # Admission
+
+    def _enqueue(self, priority: int) -> tuple:
+        ticket = (priority, next(self._arrivals))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: tuple) -> None:
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _poll(self, ticket: tuple, tokens: int) -> float:
+        """
+        Admits the ticket and returns 0 if it is first in line and capacity is
+        available, otherwise returns how long to wait before polling again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._waiting[0] != ticket:
+                return MAX_POLL_SECONDS
+
+            self.requests.refill(now)
+            self.tokens.refill(now)
+
+            reserve = self.batch_reserve if ticket[0] == BATCH else 0.0
+            wait = max(
+                self.requests.wait_time(1, reserve * self.requests.capacity),
+                self.tokens.wait_time(tokens, reserve * self.tokens.capacity)
+            )
+            if wait > 0:
+                return wait
+
+            heapq.heappop(self._waiting)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            return 0.0
+
+    def _check_deadline(self, wait: float, deadline_at: float) -> None:
+        if time.monotonic() + wait > deadline_at:
+            raise TimeoutError(f"{self.name}: no capacity before the call deadline")
+
+    def _acquire(self, tokens: int, priority: int, deadline_at: float) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._poll(ticket, tokens)
+                if wait == 0:
+                    return
+                self._check_deadline(min(wait, MAX_POLL_SECONDS), deadline_at)
+                time.sleep(min(wait, MAX_POLL_SECONDS))
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+
+    async def _aacquire(self, tokens: int, priority: int, deadline_at: float) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._poll(ticket, tokens)
+                if wait == 0:
+                    return
+                self._check_deadline(min(wait, MAX_POLL_SECONDS), deadline_at)
+                await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+
+    # Retries
+
+    def _settle(self, estimate: int, response) -> None:
+        # Corrects the token bucket with the usage the API reported
+        actual = getattr(getattr(response, "usage", None), "total_tokens", None)
+        if actual is None:
+            return
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimate - actual)
+
+    def _retry_delay(self, attempt: int, error: Exception, deadline_at: float) -> float:
+        """
+        Delay before the next attempt; re-raises 'error' if the call should give up.
+        """
+        if attempt >= self.max_retries:
+            raise error
+
+        cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = random.uniform(cap / 2, cap)
+
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+            # Everyone waits, more calls now would only be rejected too
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + server_delay)
+
+        if time.monotonic() + delay > deadline_at:
+            raise error
+
+        RETRIES.inc(scheduler=self.name, error=type(error).__name__)
+        logger.warning(
+            f"{self.name}: {type(error).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+        )
+        return delay
+
+    def _deadline_at(self, priority: int, deadline: Optional[float]) -> float:
+        return time.monotonic() + (deadline if deadline is not None else self.deadlines[priority])
+
+    def call(self, request: Callable[[float], Any], tokens: int, priority: int = INTERACTIVE,
+             deadline: Optional[float] = None) -> Any:
+        """
+        Runs request(timeout) under the limits, where 'timeout' is the time left
+        before the deadline (pass it to the SDK call). 'tokens' is the estimated
+        prompt plus completion size.
+        """
+        deadline_at = self._deadline_at(priority, deadline)
+
+        for attempt in itertools.count():
+            self._acquire(tokens, priority, deadline_at)
+            try:
+                response = request(max(1.0, deadline_at - time.monotonic()))
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._retry_delay(attempt, e, deadline_at))
+                continue
+
+            self._settle(tokens, response)
+            return response
+
+    async def acall(self, request: Callable[[float], Awaitable[Any]], tokens: int,
+                    priority: int = INTERACTIVE, deadline: Optional[float] = None) -> Any:
+        """
+        Async version of call(): 'request(timeout)' returns an awaitable.
+        """
+        deadline_at = self._deadline_at(priority, deadline)
+
+        for attempt in itertools.count():
+            await self._aacquire(tokens, priority, deadline_at)
+            try:
+                response = await request(max(1.0, deadline_at - time.monotonic()))
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, deadline_at))
+                continue
+
+            self._settle(tokens, response)
+            return response
+
+
+# Buckets live in each process. With several API workers every one admits its
+# share of the deployment quota: set CHAT_RPM / CHAT_TPM / EMBEDDING_RPM /
+# EMBEDDING_TPM to the values in the Azure portal and WEB_CONCURRENCY to the
+# worker count (uvicorn and gunicorn also read it as their default --workers).
+API_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def quota(name: str, default: str) -> float:
+    return float(os.getenv(name, default)) / API_WORKERS
+
+
+# One scheduler per deployment
+chat_scheduler = LLMScheduler(
+    "chat",
+    rpm=quota("CHAT_RPM", "300"),
+    tpm=quota("CHAT_TPM", "50000"),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+    interactive_deadline=float(os.getenv("LLM_INTERACTIVE_DEADLINE", "60")),
+    batch_deadline=float(os.getenv("LLM_BATCH_DEADLINE", "600"))
+)
+
+embedding_scheduler = LLMScheduler(
+    "embedding",
+    rpm=quota("EMBEDDING_RPM", "720"),
+    tpm=quota("EMBEDDING_TPM", "120000"),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+    interactive_deadline=float(os.getenv("LLM_INTERACTIVE_DEADLINE", "60")),
+    batch_deadline=float(os.getenv("LLM_BATCH_DEADLINE", "600"))
+)
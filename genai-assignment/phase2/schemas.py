@@ -21,20 +21,35 @@ class UserProfile(BaseModel):
 class ChatMessage(BaseModel):
     role: str  # user, assistant, system
     content: str
+    # Phase the message was sent in ("collecting_info" or "qa"), set by clients that track it.
+    # QA answers are only cached when every message of the history has it.
+    phase: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
     """
     Represents the request sent from Streamlit to FastAPI.
     Includes the 'language' field we added.
+    With a 'session_id' the server keeps the profile and history,
+    and 'conversation_history' / 'user_profile' are ignored.
     """
     message: str
     conversation_history: List[ChatMessage] = []
     user_profile: UserProfile = UserProfile()
     language: str = "he"  # Default to Hebrew if missing
+    session_id: Optional[str] = None
+
+
+class SessionRequest(BaseModel):
+    """
+    Starts a server-side session, optionally restoring an existing conversation.
+    """
+    conversation_history: List[ChatMessage] = []
+    user_profile: UserProfile = UserProfile()
 
 
 class ChatResponse(BaseModel):
     reply: str
     updated_user_profile: UserProfile
-    next_phase: str  # "collecting_info" or "qa"
\ No newline at end of file
+    next_phase: str  # "collecting_info" or "qa"
+    session_id: Optional[str] = None
\ No newline at end of file
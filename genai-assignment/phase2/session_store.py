@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from phase2.schemas import UserProfile
+
+
+# Messages kept per session. Older ones are dropped, the LLM only sees a
+# token-budgeted tail of the history anyway (see phase2/history.py).
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+
+
+class SessionStore:
+    """
+    Thread-safe server-side store of chat sessions, keyed by session ID.
+
+    A session holds the user profile and the conversation history, so clients
+    only send the new message on each turn. Sessions not used for
+    'ttl_seconds' expire, and the least recently used ones are evicted beyond
+    'max_sessions'.
+
+    Without 'disk_path' sessions live in this process only, so session mode
+    needs a single API worker. With 'disk_path' the SQLite file is the source
+    of truth, shared by all workers and surviving restarts: every get() checks
+    the stored 'updated' time and only reuses the in-memory copy if no other
+    process has saved the session since. The file is bounded the same way as
+    memory: expired rows and the least recently used ones beyond
+    'max_sessions' are deleted when it is opened and every PRUNE_EVERY saves.
+
+    Methods do blocking file I/O; call them from a thread on async paths.
+    """
+
+    # Disk rows are pruned every this many saves
+    PRUNE_EVERY = 256
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 24 * 3600,
+                 disk_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._saves = 0
+
+        self._db = None
+        if disk_path:
+            # Several workers write to the same file: wait for their locks instead of failing
+            self._db = sqlite3.connect(disk_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data TEXT, updated REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+            self._prune()
+            self._db.commit()
+
+    def create(self, user_profile: Optional[UserProfile] = None,
+               conversation_history: Optional[List[Dict]] = None) -> str:
+        session_id = uuid.uuid4().hex
+        self.save(session_id, {
+            "user_profile": user_profile or UserProfile(),
+            "conversation_history": list(conversation_history or [])
+        })
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """
+        Returns the session ({"user_profile", "conversation_history"}), or None
+        if it does not exist or expired.
+        """
+        now = time.time()
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if self._db is None:
+                if session is None:
+                    return None
+                if now - session["updated"] > self.ttl_seconds:
+                    self._delete(session_id)
+                    return None
+                self._sessions.move_to_end(session_id)
+                return session
+
+            row = self._db.execute(
+                "SELECT updated FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                self._sessions.pop(session_id, None)
+                return None
+            if now - row[0] > self.ttl_seconds:
+                self._delete(session_id)
+                return None
+
+            if session is not None and session["updated"] == row[0]:
+                self._sessions.move_to_end(session_id)
+                return session
+
+            # Not cached here, or saved by another worker since
+            data = json.loads(self._db.execute(
+                "SELECT data FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()[0])
+            session = {
+                "user_profile": UserProfile(**data["user_profile"]),
+                "conversation_history": data["conversation_history"],
+                "updated": row[0]
+            }
+            self._insert(session_id, session)
+            return session
+
+    def save(self, session_id: str, session: Dict) -> None:
+        session["conversation_history"] = session["conversation_history"][-SESSION_MAX_MESSAGES:]
+        session["updated"] = time.time()
+
+        with self._lock:
+            self._insert(session_id, session)
+            if self._db is not None:
+                data = {
+                    "user_profile": session["user_profile"].model_dump(),
+                    "conversation_history": session["conversation_history"]
+                }
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(data, ensure_ascii=False), session["updated"])
+                )
+                self._saves += 1
+                if self._saves % self.PRUNE_EVERY == 0:
+                    self._prune()
+                self._db.commit()
+
+    def _insert(self, session_id: str, session: Dict) -> None:
+        # Caller holds the lock
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _prune(self) -> None:
+        # Caller holds the lock (or is the constructor)
+        self._db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM sessions WHERE rowid IN ("
+            "SELECT rowid FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def _delete(self, session_id: str) -> None:
+        # Caller holds the lock
+        self._sessions.pop(session_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Store for the session mode of /chat. Set SESSION_STORE_PATH to share sessions
+# between API workers (and keep them across restarts).
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600))),
+    disk_path=os.getenv("SESSION_STORE_PATH") or None
+)
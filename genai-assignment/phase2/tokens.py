@@ -0,0 +1,35 @@
+import math
+import re
+from functools import lru_cache
+
+
+HEBREW_RE = re.compile(r"[\u0590-\u05FF]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """
+    The cl100k_base tokenizer (ada-002; close enough for gpt-4o budgets), loaded once.
+    Returns None if tiktoken is not installed or its encoding file cannot be downloaded.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens in a text.
+    Results are cached, conversation turns are counted again on every request.
+    Without tiktoken, falls back to an estimate: Hebrew averages about 1.6
+    characters per token, English and digits about 4.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    hebrew = len(HEBREW_RE.findall(text))
+    return math.ceil(hebrew / 1.6 + (len(text) - hebrew) / 4)
@@ -0,0 +1,205 @@
+import numpy as np
+from typing import Callable, List, Dict, Tuple, Optional
+
+from phase2.ann import ExactIndex, top_k_ids
+from phase2.metadata import canonical_hmo, canonical_tier
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes every row of a matrix.
+    Zero rows are left as zeros so their similarity is always 0.0.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize_vector(vector) -> Optional[np.ndarray]:
+    """
+    Returns the vector as a unit-length float32 array, or None for a zero vector.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+
+def partition_key(chunk: Dict) -> Tuple[str, str]:
+    """
+    Partition of a chunk: (hmo, tier), with "" for chunks that apply to all HMOs / tiers.
+    """
+    return (chunk.get("hmo") or "", chunk.get("tier") or "")
+
+
+class Partition:
+    """
+    Rows of the store sharing one (hmo, tier) key, with their own search backend.
+    When the rows are contiguous (indexes are written sorted by partition),
+    'matrix' is a view into the store matrix and nothing is copied.
+    """
+
+    def __init__(self, key: Tuple[str, str], ids: np.ndarray, matrix: np.ndarray):
+        self.key = key
+        self.ids = ids
+        self.matrix = matrix
+        self.index = ExactIndex(matrix)
+
+    @property
+    def name(self) -> str:
+        hmo, tier = self.key
+        return f"{hmo or 'all'}-{tier or 'all'}"
+
+
+class VectorStore:
+    """
+    In-memory vector store backed by one contiguous float32 matrix.
+
+    Embeddings are normalized once when the store is built, so cosine
+    similarity against a query is a single matrix-vector product.
+    Chunk metadata (text, source) is kept in a parallel list, row i of
+    the matrix belongs to chunks[i]. 'version' identifies the index
+    content when the store was loaded from disk, and 'lexical' is the BM25
+    index saved with it (None when it has to be built from the chunk texts).
+
+    Rows are grouped into partitions by HMO and tier metadata, each with its
+    own search backend (exact by default, or an approximate backend from
+    phase2.ann). A search only scans the partitions it is asked for.
+    """
+
+    def __init__(self, chunks: List[Dict], embeddings: np.ndarray, version: str = ""):
+        if len(chunks) != len(embeddings):
+            raise ValueError("Number of chunks and embeddings must match")
+
+        self.chunks = chunks
+        self.version = version
+        self.files: Dict[str, str] = {}
+        self.lexical = None
+        self.matrix = np.ascontiguousarray(
+            normalize_rows(np.asarray(embeddings, dtype=np.float32)),
+            dtype=np.float32
+        )
+        self._build_partitions()
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "VectorStore":
+        """
+        Builds a store from a list of chunk dicts with an "embedding" key.
+        The 'embedding' key is moved into the matrix, everything else stays as metadata.
+        Records are ordered by partition so every partition is a contiguous block.
+        """
+        records = sorted(records, key=partition_key)
+        chunks = [{k: v for k, v in r.items() if k != "embedding"} for r in records]
+
+        if not records:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+
+        embeddings = np.array([r["embedding"] for r in records], dtype=np.float32)
+        return cls(chunks, embeddings)
+
+    @classmethod
+    def from_normalized(cls, chunks: List[Dict], matrix: np.ndarray, version: str = "",
+                        files: Optional[Dict[str, str]] = None) -> "VectorStore":
+        """
+        Wraps an already-normalized float32 matrix without copying it.
+        Used for memory-mapped indexes loaded from disk; 'files' maps each
+        source file to the content hash it was indexed from.
+        """
+        if len(chunks) != len(matrix):
+            raise ValueError("Number of chunks and embeddings must match")
+
+        store = cls.__new__(cls)
+        store.chunks = chunks
+        store.version = version
+        store.files = files or {}
+        store.lexical = None
+        store.matrix = matrix
+        store._build_partitions()
+        return store
+
+    def _build_partitions(self) -> None:
+        rows: Dict[Tuple[str, str], list] = {}
+        for i, chunk in enumerate(self.chunks):
+            rows.setdefault(partition_key(chunk), []).append(i)
+
+        self.partitions: Dict[Tuple[str, str], Partition] = {}
+        for key, ids in rows.items():
+            ids = np.array(ids, dtype=np.int64)
+            if ids[-1] - ids[0] + 1 == len(ids):
+                matrix = self.matrix[ids[0]:ids[-1] + 1]
+            else:
+                matrix = np.ascontiguousarray(self.matrix[ids])
+            self.partitions[key] = Partition(key, ids, matrix)
+
+    def use_backend(self, factory: Callable[[np.ndarray, str], object]) -> None:
+        """
+        Replaces the search backend of every partition with factory(matrix, partition_name).
+        """
+        for partition in self.partitions.values():
+            partition.index = factory(partition.matrix, partition.name)
+
+    def partition_keys(self, hmo: Optional[str] = None, tier: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Partitions relevant to a user: their HMO and tier plus the general ones.
+        An unknown HMO or tier does not filter on that dimension.
+        """
+        hmo, tier = canonical_hmo(hmo), canonical_tier(tier)
+        return [
+            key for key in self.partitions
+            if (hmo is None or key[0] in ("", hmo))
+            and (tier is None or key[1] in ("", tier))
+        ]
+
+    def row_ids(self, keys: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Rows belonging to the given partitions.
+        """
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.partitions[key].ids for key in keys])
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search_ids(self, query: np.ndarray, top_k: int,
+                   keys: Optional[List[Tuple[str, str]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row ids and scores of the top_k rows for an already-normalized query, best first.
+        Only the partitions in 'keys' are searched (all of them if None).
+        """
+        if keys is None:
+            keys = list(self.partitions)
+        if len(self) == 0 or top_k <= 0 or not keys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        all_ids, all_scores = [], []
+        for key in keys:
+            partition = self.partitions[key]
+            local_ids, scores = partition.index.search(query, top_k)
+            all_ids.append(partition.ids[local_ids])
+            all_scores.append(scores)
+
+        ids, scores = np.concatenate(all_ids), np.concatenate(all_scores)
+        best = top_k_ids(scores, top_k)
+        return ids[best], scores[best]
+
+    def similarities(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """
+        Exact cosine similarity of a normalized query with the given rows.
+        """
+        return self.matrix[ids] @ query
+
+    def search(self, query_vector: List[float], top_k: int = 3,
+               hmo: Optional[str] = None, tier: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """
+        Returns the top_k (score, chunk) pairs by cosine similarity, best first.
+        If hmo / tier are given, only the partitions relevant to them are searched.
+        """
+        query = normalize_vector(query_vector)
+        if query is None:
+            return []
+
+        ids, scores = self.search_ids(query, top_k, self.partition_keys(hmo, tier))
+
+        return [(float(score), self.chunks[i]) for i, score in zip(ids, scores)]
@@ -1,13 +1,21 @@
 import streamlit as st
 import requests
 import base64
+import json
+import os
 from pathlib import Path
 
 
 # Configuration 
 API_URL = "http://127.0.0.1:8000/chat"
+STREAM_URL = "http://127.0.0.1:8000/chat/stream"
+SESSION_URL = "http://127.0.0.1:8000/session"
 LOGS_URL = "http://127.0.0.1:8000/logs"
 
+# Session mode: the server keeps the profile and history, and each request
+# carries only the new message. Enable with CHAT_SESSION_MODE=1.
+SESSION_MODE = os.getenv("CHAT_SESSION_MODE", "0") == "1"
+
 st.set_page_config(
     page_title="Health Services Assistant",
     layout="centered",
@@ -125,10 +133,20 @@ def display_sidebar():
     try:
         # Pass the access token to the backend API
         params = {"access": access_token} if access_token else {}
+
+        # After the first poll, only ask for the lines written since the last one
+        if "log_cursor" in st.session_state:
+            params["cursor"] = st.session_state.log_cursor
         log_response = requests.get(LOGS_URL, params=params)
         
         if log_response.status_code == 200:
-            logs = log_response.json().get("logs", [])
+            data = log_response.json()
+            if "cursor" in data:
+                st.session_state.log_cursor = data["cursor"]
+                st.session_state.log_lines = (st.session_state.get("log_lines", []) + data["logs"])[-50:]
+                logs = st.session_state.log_lines
+            else:
+                logs = data.get("logs", [])
             if logs:
                 log_text = "".join(logs)
                 st.sidebar.code(log_text, language="log")
@@ -141,6 +159,51 @@ def display_sidebar():
 
     return lang_code
 
+def stream_tokens(response, result):
+    """
+    Yields the reply tokens of a /chat/stream response (Server-Sent Events).
+    The final "done" or "error" event payload is stored in result["data"].
+    """
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):])
+            if event == "token":
+                yield data["text"]
+            else:
+                result["data"] = data
+
+
+def build_payload(user_input, language):
+    """
+    Request body for the chat API. In session mode only the new message is sent,
+    otherwise the full profile and conversation.
+    """
+    if not SESSION_MODE:
+        return {
+            "message": user_input,
+            "language": language,  # Sends 'he' or 'en'
+            "user_profile": st.session_state.user_profile,
+            "conversation_history": st.session_state.conversation
+        }
+
+    if "session_id" not in st.session_state:
+        # Seed the session with the local state (the new message is sent separately)
+        response = requests.post(SESSION_URL, json={
+            "user_profile": st.session_state.user_profile,
+            "conversation_history": st.session_state.conversation[:-1]
+        })
+        response.raise_for_status()
+        st.session_state.session_id = response.json()["session_id"]
+
+    return {
+        "message": user_input,
+        "language": language,
+        "session_id": st.session_state.session_id
+    }
+
 
 #  Text Content Dictionary 
 
@@ -155,6 +218,7 @@ TEXTS = {
         "phase_qa": "שלב נוכחי: שאלות על שירותים רפואיים",
         "placeholder": "הקלד הודעה כאן...",
         "spinner": "חושב...",
+        "not_ready": "מאגר הידע עדיין נטען. אנא נסו שוב בעוד מספר שניות.",
         "dir": "rtl"
     },
     "en": {
@@ -167,6 +231,7 @@ TEXTS = {
         "phase_qa": "Current Phase: Medical Services Q&A",
         "placeholder": "Type your message here...",
         "spinner": "Thinking...",
+        "not_ready": "The knowledge base is still loading. Please try again in a few seconds.",
         "dir": "ltr"
     }
 }
@@ -219,35 +284,52 @@ user_input = st.chat_input(t["placeholder"])
 
 if user_input:
     # Add user message to history
+    # The phase is sent with every message so the API knows which turns were QA
+    turn_phase = st.session_state.phase
     st.session_state.conversation.append(
-        {"role": "user", "content": user_input}
+        {"role": "user", "content": user_input, "phase": turn_phase}
     )
 
-    # Prepare Payload 
-    payload = {
-        "message": user_input,
-        "language": selected_lang,  # Sends 'he' or 'en'
-        "user_profile": st.session_state.user_profile,
-        "conversation_history": st.session_state.conversation
-    }
+    # Show the user message right away, the reply is rendered as it streams
+    with st.chat_message("user"):
+        st.write(user_input)
 
     #Call API
-    with st.spinner(t["spinner"]):
-        try:
-            response = requests.post(API_URL, json=payload)
-            response.raise_for_status()
-            data = response.json()
-
-            # 4. Update UI with Assistant Response
-            st.session_state.conversation.append(
-                {"role": "assistant", "content": data["reply"]}
-            )
-
-            st.session_state.user_profile = data["updated_user_profile"]
-            st.session_state.phase = data["next_phase"]
-            
-            # Refresh to show new message
-            st.rerun()
-            
-        except requests.exceptions.RequestException as e:
-            st.error(f"Server Connection Error: {e}")
\ No newline at end of file
+    try:
+        with st.spinner(t["spinner"]):
+            response = requests.post(STREAM_URL, json=build_payload(user_input, selected_lang), stream=True)
+
+            # Session expired on the server: start a new one from the local state and retry
+            if SESSION_MODE and response.status_code == 404:
+                st.session_state.pop("session_id", None)
+                response = requests.post(STREAM_URL, json=build_payload(user_input, selected_lang), stream=True)
+
+        # Knowledge base still loading: drop the unanswered message so it can be resent
+        if response.status_code == 503:
+            st.session_state.conversation.pop()
+            st.warning(t["not_ready"])
+            st.stop()
+
+        response.raise_for_status()
+
+        result = {}
+        with st.chat_message("assistant"):
+            st.write_stream(stream_tokens(response, result))
+
+        if "data" not in result:
+            raise requests.exceptions.ConnectionError("Stream ended before the reply was complete.")
+        data = result["data"]
+
+        # 4. Update UI with Assistant Response
+        st.session_state.conversation.append(
+            {"role": "assistant", "content": data["reply"], "phase": turn_phase}
+        )
+
+        st.session_state.user_profile = data["updated_user_profile"]
+        st.session_state.phase = data["next_phase"]
+        
+        # Refresh to show new message
+        st.rerun()
+        
+    except requests.exceptions.RequestException as e:
+        st.error(f"Server Connection Error: {e}")